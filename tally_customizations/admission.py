@@ -0,0 +1,150 @@
+"""
+Admission control for heavy ledger report runs.
+
+A few year-long ledgers running at once saturate the database for everyone
+else. Before a ledger report runs, a cheap COUNT of the GL entries it covers
+estimates its cost; runs above "heavy_report_rows" (site config) need one of
+"heavy_report_slots" site-wide slots. The slots are a semaphore in Redis: a
+sorted set of holders scored by lease expiry, so the slot of a worker that
+died is reclaimed once its lease runs out. A heavy run that finds all slots
+taken waits (the user is told so) instead of adding to the load, and gives
+up with a message after "heavy_report_wait" seconds.
+
+Light runs are never held back.
+"""
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from tally_customizations.in_filter import in_condition
+from tally_customizations.ledger_query import get_account_range
+from tally_customizations.parallel_query import get_companies
+
+# Defaults, override in site_config.json; 0 slots switches admission control off
+HEAVY_REPORT_SLOTS = 2
+HEAVY_REPORT_ROWS = 50000
+HEAVY_REPORT_WAIT = 120
+
+# Longer than a web request may run, a slot outlives its holder by at most this
+LEASE_SECONDS = 900
+
+POLL_INTERVAL = 0.5
+
+# Atomically drop expired leases and take a slot if one is free
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+	redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+	return 0
+end
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+def get_slots():
+	return max(cint(frappe.conf.get("heavy_report_slots", HEAVY_REPORT_SLOTS)), 0)
+
+
+def get_slots_key():
+	return frappe.cache().make_key("heavy_report_slots")
+
+
+def estimate_rows(filters, account_type=None):
+	"""GL entries a report run covers, from a COUNT on the filtered range
+
+	account_type limits the count to accounts of that type (Cash Book, Banking)
+	when no account is selected.
+	"""
+	conditions = ["company IN %(companies)s", "posting_date BETWEEN %(from_date)s AND %(to_date)s", "is_cancelled = 0"]
+	values = {
+		"companies": tuple(get_companies(filters)),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date"),
+		"account": filters.get("account"),
+		"account_type": account_type
+	}
+
+	account_range = get_account_range(filters.get("account"))
+	if account_range:
+		# Group account: every ledger in its nested set range
+		conditions.append("""account IN (
+			SELECT name FROM `tabAccount` WHERE lft >= %(lft)s AND rgt <= %(rgt)s
+		)""")
+		values["lft"], values["rgt"] = account_range
+	elif filters.get("account"):
+		conditions.append("account = %(account)s")
+	elif account_type:
+		conditions.append("""account IN (
+			SELECT name FROM `tabAccount` WHERE company IN %(companies)s AND account_type = %(account_type)s
+		)""")
+
+	# A single party (Dynamic Link) or several (MultiSelectList), as in the data queries
+	party = filters.get("party")
+	parties = [p for p in (party if isinstance(party, (list, tuple)) else [party]) if p]
+	if filters.get("party_type") and parties:
+		values["party_type"] = filters.get("party_type")
+		conditions.append("party_type = %(party_type)s AND " + in_condition("party", parties, "parties", values))
+
+	return frappe.db.sql(f"""
+		SELECT COUNT(*)
+		FROM `tabGL Entry`
+		WHERE {" AND ".join(conditions)}
+	""", values)[0][0]
+
+
+def is_heavy(filters, account_type=None):
+	"""Check if a report run needs a slot"""
+	if not get_slots():
+		return False
+	threshold = cint(frappe.conf.get("heavy_report_rows")) or HEAVY_REPORT_ROWS
+	return estimate_rows(filters, account_type) >= threshold
+
+
+def acquire_slot(report_name):
+	"""Wait for a free slot and take it, returns the holder token"""
+	token = frappe.generate_hash(length=12)
+	wait = cint(frappe.conf.get("heavy_report_wait")) or HEAVY_REPORT_WAIT
+	started = time.monotonic()
+	notified = False
+
+	while True:
+		now = time.time()
+		running = frappe.cache().eval(ACQUIRE_SCRIPT, 1, get_slots_key(), now, get_slots(), now + LEASE_SECONDS, token)
+		if not running:
+			return token
+
+		if time.monotonic() - started >= wait:
+			frappe.throw(
+				_("The server is busy with {0} other large reports. Please try {1} again in a few minutes, or narrow the date range.").format(running, _(report_name)),
+				title=_("Server Busy")
+			)
+
+		if not notified:
+			frappe.publish_realtime("heavy_report_queued", {
+				"report_name": report_name,
+				"running": running
+			}, user=frappe.session.user)
+			notified = True
+
+		time.sleep(POLL_INTERVAL)
+
+
+def release_slot(token):
+	frappe.cache().zrem(get_slots_key(), token)
+
+
+@contextmanager
+def report_slot(report_name, filters, account_type=None):
+	"""Run the block holding a heavy report slot, if the run is heavy"""
+	if not is_heavy(filters, account_type):
+		yield
+		return
+
+	token = acquire_slot(report_name)
+	try:
+		yield
+	finally:
+		release_slot(token)
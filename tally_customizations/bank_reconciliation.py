@@ -0,0 +1,217 @@
+"""
+Bank statement matching for the Banking report.
+
+Statement lines (CSV or OFX) are matched against the bank GL entries on
+amount, direction, reference and a date window. GL entries are indexed by
+(direction, amount) in a hash map, each bucket sorted by date, so every
+statement line is matched with a dict lookup and a binary search instead of
+a pairwise comparison, and matched entries leave their bucket: O(n log n)
+overall.
+
+Parse errors are raised as ValueError with the statement line.
+"""
+import csv
+import io
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+import frappe
+from frappe import _, _dict
+from frappe.utils import flt, getdate
+
+from tally_customizations.ledger_totals import to_minor_units
+
+# Days a statement line may be booked before or after its GL entry
+DATE_WINDOW = 3
+
+# Header names recognised in statement CSVs, compared lowercased
+CSV_COLUMNS = {
+	"date": ("date", "transaction date", "txn date", "value date", "posting date", "booking date"),
+	"description": ("description", "narration", "particulars", "details", "memo", "remarks"),
+	"reference": ("reference", "ref", "ref no", "reference no", "cheque no", "chq no", "cheque number"),
+	"debit": ("debit", "withdrawal", "withdrawals", "paid out", "money out"),
+	"credit": ("credit", "deposit", "deposits", "paid in", "money in"),
+	"amount": ("amount", "transaction amount")
+}
+
+
+def normalize_reference(reference):
+	"""Reference in a comparable form: upper case, letters and digits only"""
+	return re.sub(r"[^0-9A-Z]", "", (reference or "").upper())
+
+
+def parse_statement(content, filename=""):
+	"""Parse a bank statement into lines of date, amount (+ in, - out), reference, description"""
+	if isinstance(content, bytes):
+		content = content.decode("utf-8-sig", errors="replace")
+
+	if filename.lower().endswith(".ofx") or "<OFX>" in content[:2000].upper():
+		return parse_ofx(content)
+	return parse_csv(content)
+
+
+def parse_csv(content):
+	"""Parse a CSV statement, recognising common bank column headers"""
+	reader = csv.reader(io.StringIO(content))
+	header = next(reader, None)
+	if not header:
+		return []
+
+	names = [column.strip().lower() for column in header]
+	index = {}
+	for field, aliases in CSV_COLUMNS.items():
+		for alias in aliases:
+			if alias in names:
+				index[field] = names.index(alias)
+				break
+
+	if "date" not in index or not ("amount" in index or "debit" in index or "credit" in index):
+		raise ValueError(_("Could not find Date and Amount (or Debit/Credit) columns in the statement"))
+
+	def cell(row, field):
+		position = index.get(field)
+		return row[position].strip() if position is not None and position < len(row) else ""
+
+	lines = []
+	for row_no, row in enumerate(reader, start=2):
+		if not any(row) or not cell(row, "date"):
+			continue
+
+		if "amount" in index:
+			amount = parse_amount(cell(row, "amount"))
+		else:
+			amount = parse_amount(cell(row, "credit")) - parse_amount(cell(row, "debit"))
+
+		lines.append(_dict({
+			"line": row_no,
+			"date": parse_date(cell(row, "date"), row_no),
+			"amount": amount,
+			"reference": cell(row, "reference"),
+			"description": cell(row, "description")
+		}))
+
+	return lines
+
+
+def parse_ofx(content):
+	"""Parse the STMTTRN blocks of an OFX statement (SGML or XML)"""
+	lines = []
+
+	for line_no, block in enumerate(re.findall(r"<STMTTRN>(.*?)</STMTTRN>", content, re.S | re.I), start=1):
+		def tag(name):
+			match = re.search(rf"<{name}>([^<\r\n]*)", block, re.I)
+			return match.group(1).strip() if match else ""
+
+		# YYYYMMDD, optionally followed by a time and timezone
+		posted = tag("DTPOSTED")[:8]
+		try:
+			date = datetime.strptime(posted, "%Y%m%d").date()
+		except ValueError:
+			raise ValueError(
+				_("Transaction {0}: {1} is not a valid date").format(line_no, posted or _("(empty)"))
+			) from None
+
+		lines.append(_dict({
+			"line": line_no,
+			"date": date,
+			"amount": flt(tag("TRNAMT")),
+			"reference": tag("CHECKNUM") or tag("REFNUM") or tag("FITID"),
+			"description": " ".join(value for value in (tag("NAME"), tag("MEMO")) if value)
+		}))
+
+	return lines
+
+
+def parse_date(value, line_no):
+	"""Parse a CSV statement date in the system date format"""
+	try:
+		# Muted so a bad date raises without also showing getdate's message
+		frappe.flags.mute_messages = True
+		return getdate(value)
+	except (ValueError, frappe.ValidationError):
+		raise ValueError(_("Line {0}: {1} is not a valid date").format(line_no, value)) from None
+	finally:
+		frappe.flags.mute_messages = False
+
+
+def parse_amount(value):
+	"""Parse '1,234.50', '(1,234.50)' or '-1234.5' as a float"""
+	value = (value or "").replace(",", "").strip()
+	if value.startswith("(") and value.endswith(")"):
+		value = "-" + value[1:-1]
+	return flt(value)
+
+
+def build_index(gl_entries):
+	"""Index GL entries by (direction, amount in cents), each bucket sorted by date"""
+	index = {}
+	for gle in gl_entries:
+		amount = to_minor_units(flt(gle.debit) - flt(gle.credit))
+		index.setdefault((amount > 0, abs(amount)), []).append(gle)
+
+	buckets = {}
+	for key, entries in index.items():
+		entries.sort(key=lambda gle: getdate(gle.posting_date))
+		buckets[key] = ([getdate(gle.posting_date) for gle in entries], entries)
+
+	return buckets
+
+
+def match_statement(statement_lines, gl_entries, date_window=DATE_WINDOW):
+	"""Match statement lines to GL entries
+
+	A line matches the GL entries with the same direction and amount posted
+	within date_window days. A candidate with the same reference wins outright;
+	otherwise a single candidate is a match and several are ambiguous. Each GL
+	entry is matched at most once.
+	"""
+	buckets = build_index(gl_entries)
+	window = timedelta(days=date_window)
+	used = set()
+	offered = set()
+
+	matched = []
+	ambiguous = []
+	unmatched_statement = []
+
+	for line in sorted(statement_lines, key=lambda line: line.date):
+		amount = to_minor_units(line.amount)
+		dates, entries = buckets.get((amount > 0, abs(amount)), ([], []))
+
+		# Binary search the date window within the (direction, amount) bucket,
+		# matched entries are removed so the window only holds free ones
+		start = bisect_left(dates, line.date - window)
+		end = bisect_right(dates, line.date + window)
+		candidates = range(start, end)
+
+		reference = normalize_reference(line.reference)
+		if reference:
+			by_reference = [
+				position for position in candidates
+				if normalize_reference(entries[position].reference) == reference
+			]
+			if by_reference:
+				candidates = by_reference[:1]
+
+		if len(candidates) == 1:
+			position = candidates[0]
+			gle = entries.pop(position)
+			del dates[position]
+			used.add(gle.name)
+			matched.append(_dict({"statement": line, "gl_entry": gle}))
+		elif candidates:
+			ambiguous.append(_dict({"statement": line, "candidates": [entries[position] for position in candidates]}))
+			offered.update(entries[position].name for position in candidates)
+		else:
+			unmatched_statement.append(line)
+
+	# Candidates of an ambiguous line are listed with it, not again as unmatched
+	unmatched_gl = [gle for gle in gl_entries if gle.name not in used and gle.name not in offered]
+
+	return _dict({
+		"matched": matched,
+		"ambiguous": ambiguous,
+		"unmatched_statement": unmatched_statement,
+		"unmatched_gl": unmatched_gl
+	})
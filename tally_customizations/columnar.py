@@ -0,0 +1,90 @@
+"""
+Compact columnar response format for the ledger reports.
+
+Report rows normally travel as JSON objects that repeat every key on every
+row. With the "Compact Transfer" filter on, the ledger reports send one
+array per field instead, with repeated strings (accounts, voucher types,
+particulars) replaced by indexes into a per-field dictionary. Those runs go
+to run_compact instead of frappe.desk.query_report.run (public/js/compact_rows.js
+routes them), which turns the payload back into rows before the report is
+rendered. Other reports and runs keep the core endpoint.
+
+Payload:
+
+	{
+		"compact": 1,
+		"length": 3,
+		"fields": ["account", "debit"],
+		"columns": [[0, 0, 1], [10.0, null, 5.0]],
+		"dictionaries": {"account": ["Cash - TC", "Bank - TC"]}
+	}
+"""
+import json
+
+import frappe
+from frappe import _
+
+# Reports that can send their rows in the compact format
+COMPACT_REPORTS = ("Tally Ledger", "Cash Book", "Banking")
+
+
+def encode_rows(rows):
+	"""Rows as column arrays, string fields with repeated values dictionary-encoded"""
+	fields = []
+	seen = set()
+	for row in rows:
+		for field in row:
+			if field not in seen:
+				seen.add(field)
+				fields.append(field)
+
+	columns = [[row.get(field) for row in rows] for field in fields]
+	dictionaries = {}
+
+	for field, values in zip(fields, columns, strict=True):
+		if not all(value is None or isinstance(value, str) for value in values):
+			continue
+
+		# Only worth it when values repeat, e.g. not for voucher numbers
+		distinct = {}
+		for value in values:
+			if value is not None and value not in distinct:
+				distinct[value] = len(distinct)
+		if len(distinct) * 2 > len(values):
+			continue
+
+		values[:] = [None if value is None else distinct[value] for value in values]
+		dictionaries[field] = list(distinct)
+
+	return {
+		"compact": 1,
+		"length": len(rows),
+		"fields": fields,
+		"columns": columns,
+		"dictionaries": dictionaries
+	}
+
+
+@frappe.whitelist()
+@frappe.read_only()
+def run_compact(report_name, filters=None, **kwargs):
+	"""frappe.desk.query_report.run of a ledger report, with the rows encoded when Compact Transfer is on"""
+	from frappe.desk.query_report import run
+
+	if report_name not in COMPACT_REPORTS:
+		frappe.throw(_("{0} does not support Compact Transfer").format(_(report_name)))
+
+	response = run(report_name, filters=filters, **kwargs)
+
+	if isinstance(filters, str):
+		filters = json.loads(filters or "{}")
+
+	if (
+		(filters or {}).get("compact_transfer")
+		and isinstance(response, dict)
+		and isinstance(response.get("result"), list)
+		and all(isinstance(row, dict) for row in response["result"])
+	):
+		response["result"] = encode_rows(response["result"])
+
+	return response
@@ -0,0 +1,327 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("check-template-queries")
+@click.option("--fail-on-new", is_flag=True, default=False, help="Exit with an error on in-loop DB calls not in the baseline")
+@click.option("--update-baseline", is_flag=True, default=False, help="Accept the current in-loop DB calls as the baseline")
+def check_template_queries(fail_on_new=False, update_baseline=False):
+	"""Report database calls in the app's Jinja templates with their loop nesting depth"""
+	from tally_customizations.template_lint import (
+		analyze_templates,
+		get_in_loop_counts,
+		get_new_in_loop_calls,
+		load_baseline,
+		save_baseline,
+	)
+
+	results, errors = analyze_templates()
+
+	for path, calls in sorted(results.items()):
+		for lineno, name, depth in calls:
+			marker = f"in loop (depth {depth})" if depth else "top level"
+			click.echo(f"{path}:{lineno}: {name} - {marker}")
+
+	for path, error in sorted(errors.items()):
+		click.secho(f"{path}: could not parse template, {error}", fg="yellow")
+
+	counts = get_in_loop_counts(results)
+
+	if update_baseline:
+		save_baseline(counts)
+		click.secho("Baseline updated", fg="green")
+		return
+
+	new_calls = get_new_in_loop_calls(counts, load_baseline())
+	for path, name, count, allowed in new_calls:
+		click.secho(f"{path}: {name} called {count} time(s) inside loops, baseline allows {allowed}", fg="red")
+
+	if new_calls and fail_on_new:
+		raise SystemExit(1)
+
+
+@click.command("benchmark-ledger-fetch")
+@click.option("--company", required=True, help="Company to fetch the ledger of")
+@click.option("--from-date", required=True, help="Start of the period (YYYY-MM-DD)")
+@click.option("--to-date", required=True, help="End of the period (YYYY-MM-DD)")
+@click.option("--partition-months", default=1, type=int, help="Months per partition")
+@click.option("--workers", default=None, type=int, help="Parallel partition queries (default: ledger_query_workers)")
+@click.option("--runs", default=3, type=int, help="Timed runs of each mode, the best one is reported")
+@pass_context
+def benchmark_ledger_fetch(context, company, from_date, to_date, partition_months=1, workers=None, runs=3):
+	"""Time Tally Ledger GL entry fetching in one query against month partitions in parallel"""
+	import time
+
+	import frappe
+	from frappe import _dict
+
+	from tally_customizations.parallel_query import fetch_in_partitions, get_month_partitions
+	from tally_customizations.tally_customizations.report.tally_ledger.tally_ledger import query_gl_entries
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		filters = _dict({"company": company, "from_date": from_date, "to_date": to_date})
+		partitions = get_month_partitions(from_date, to_date, partition_months)
+
+		def best_of(fetch):
+			timings = []
+			for _ in range(max(runs, 1)):
+				start = time.perf_counter()
+				rows = len(fetch())
+				timings.append(time.perf_counter() - start)
+			return min(timings), rows
+
+		serial, serial_rows = best_of(lambda: query_gl_entries(filters, False))
+		parallel, parallel_rows = best_of(lambda: fetch_in_partitions(
+			filters, query_gl_entries, False, months=partition_months, max_workers=workers
+		))
+
+		click.echo(f"Single query: {serial:.3f}s, {serial_rows} rows")
+		click.echo(f"{len(partitions)} partitions: {parallel:.3f}s, {parallel_rows} rows")
+		click.echo(f"Speedup: {serial / parallel:.2f}x" if parallel else "Speedup: n/a")
+
+		if serial_rows != parallel_rows:
+			click.secho("Row counts differ between the two modes", fg="red")
+			raise SystemExit(1)
+	finally:
+		frappe.destroy()
+
+
+@click.command("benchmark-ledger-totals")
+@click.option("--rows", default=100000, type=int, help="Debit and credit amounts per run")
+@click.option("--runs", default=3, type=int, help="Timed runs of each mode, the best one is reported")
+@click.option("--seed", default=None, type=int, help="Seed for the random amounts")
+def benchmark_ledger_totals(rows=100000, runs=3, seed=None):
+	"""Time ledger totals with rounded floats against LedgerTotals per entry and in batches"""
+	import random
+	import time
+
+	from frappe.utils import flt
+
+	from tally_customizations.ledger_totals import LedgerTotals, np
+
+	rng = random.Random(seed)
+	debits = [round(rng.uniform(0, 100000), 2) for _ in range(rows)]
+	credits = [round(rng.uniform(0, 100000), 2) for _ in range(rows)]
+
+	def rounded_floats():
+		# What Cash Book and Banking did before: round after every addition
+		total_debit = total_credit = 0.0
+		for debit, credit in zip(debits, credits, strict=True):
+			total_debit = flt(total_debit + debit, 2)
+			total_credit = flt(total_credit + credit, 2)
+		return total_debit, total_credit
+
+	def per_entry():
+		totals = LedgerTotals()
+		for debit, credit in zip(debits, credits, strict=True):
+			totals.add(debit, credit)
+		return totals.period_debit, totals.period_credit
+
+	def in_batches():
+		totals = LedgerTotals()
+		totals.add_many(debits, credits)
+		return totals.period_debit, totals.period_credit
+
+	modes = [("Rounded floats", rounded_floats), ("LedgerTotals.add", per_entry), ("LedgerTotals.add_many", in_batches)]
+	click.echo(f"{rows} entries, NumPy {'available' if np is not None else 'not installed'}")
+
+	results = []
+	for label, mode in modes:
+		timings = []
+		for _ in range(max(runs, 1)):
+			start = time.perf_counter()
+			result = mode()
+			timings.append(time.perf_counter() - start)
+		results.append(result)
+		best = min(timings)
+		click.echo(f"{label:<24}{best:>9.3f}s{rows / best if best else 0:>14,.0f} entries/s")
+
+	if len(set(results)) > 1:
+		click.secho(f"Totals differ between the modes: {results}", fg="red")
+		raise SystemExit(1)
+
+
+@click.command("build-gl-cache")
+@click.option("--company", default=None, help="Only build the cache of this company")
+@pass_context
+def build_gl_cache(context, company=None):
+	"""Build or update the columnar cache of closed-period GL entries"""
+	import frappe
+
+	from tally_customizations.gl_cache import build_cache, np
+
+	if np is None:
+		click.secho("NumPy is not installed, the GL cache is not available", fg="red")
+		raise SystemExit(1)
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		for name in [company] if company else frappe.get_all("Company", pluck="name"):
+			build_cache(name)
+			click.echo(f"{name}: cache up to date")
+	finally:
+		frappe.destroy()
+
+
+@click.command("load-test-reports")
+@click.option("--company", required=True, help="Default company of the report filters")
+@click.option("--from-date", required=True, help="Default start of the period (YYYY-MM-DD)")
+@click.option("--to-date", required=True, help="Default end of the period (YYYY-MM-DD)")
+@click.option("--users", default=10, type=int, help="Concurrent simulated users")
+@click.option("--duration", default=60, type=float, help="Seconds to run for, 0 to only stop on --requests")
+@click.option("--requests", "requests_per_user", default=0, type=int, help="Requests per user, 0 for no limit")
+@click.option("--think-time", default=2.0, type=float, help="Mean seconds a user waits between requests")
+@click.option("--ramp-up", default=0.0, type=float, help="Seconds over which the users are started")
+@click.option("--scenarios", default=None, help="JSON file with the scenario and filter mix")
+@click.option("--url", default=None, help="Site URL (default: the site's own URL)")
+@click.option("--user", default="Administrator", help="User to log in as")
+@click.option("--password", default=None, help="Password of the user")
+@click.option("--api-key", default=None, help="API key to authenticate with instead of a password")
+@click.option("--api-secret", default=None, help="API secret for --api-key")
+@click.option("--seed", default=None, type=int, help="Random seed, to repeat the same request sequence")
+@click.option("--output", default=None, help="Also write the summary as JSON to this file")
+@pass_context
+def load_test_reports(context, company, from_date, to_date, users=10, duration=60, requests_per_user=0,
+		think_time=2.0, ramp_up=0.0, scenarios=None, url=None, user="Administrator", password=None,
+		api_key=None, api_secret=None, seed=None, output=None):
+	"""Run the ledger reports and prints as many concurrent users against the site"""
+	import json
+
+	import frappe
+	from frappe.utils import get_url
+
+	from tally_customizations.load_test import LoadTest, load_scenarios
+
+	if not (password or api_key):
+		click.secho("Give --password or --api-key and --api-secret", fg="red")
+		raise SystemExit(1)
+
+	if not (duration or requests_per_user):
+		click.secho("Give --duration or --requests, or the run never ends", fg="red")
+		raise SystemExit(1)
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		load_test = LoadTest(
+			url or get_url(),
+			load_scenarios(scenarios, {"company": company, "from_date": from_date, "to_date": to_date}),
+			users,
+			duration=duration,
+			requests_per_user=requests_per_user,
+			think_time=think_time,
+			ramp_up=ramp_up,
+			auth={"user": user, "password": password, "api_key": api_key, "api_secret": api_secret},
+			seed=seed
+		)
+		click.echo(f"{users} users against {load_test.url} ...")
+		summary = load_test.get_summary(load_test.run())
+	finally:
+		frappe.destroy()
+
+	click.echo(f"\n{'Scenario':<24}{'Requests':>9}{'Errors':>8}{'Req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'Max':>9}{'KiB':>9}")
+	for label, stats in [*summary["scenarios"].items(), ("Total", summary["total"])]:
+		click.echo(
+			f"{label[:23]:<24}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput']:>8.2f}"
+			f"{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['p99']:>8.2f}s{stats['max']:>8.2f}s{stats['avg_kib']:>9.0f}"
+		)
+
+	connections = summary.get("connections")
+	if connections:
+		click.echo(
+			f"\nDB connections: {connections['baseline']} before, peak {connections['peak_connected']}, "
+			f"avg {connections['avg_connected']:.1f}; running queries peak {connections['peak_running']}, "
+			f"avg {connections['avg_running']:.1f}"
+		)
+
+	for error, count in sorted(summary["errors"].items(), key=lambda e: -e[1]):
+		click.secho(f"{count} x {error}", fg="red")
+
+	if output:
+		with open(output, "w") as f:
+			json.dump(summary, f, indent=1)
+
+
+@click.command("lookup-cache-stats")
+@click.option("--reset", is_flag=True, default=False, help="Reset the counters after showing them")
+@pass_context
+def lookup_cache_stats(context, reset=False):
+	"""Show how many master-data queries the report lookup memo saved"""
+	import frappe
+
+	from tally_customizations.lookup_cache import get_stats, reset_stats
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		stats = get_stats()
+		if reset:
+			reset_stats()
+	finally:
+		frappe.destroy()
+
+	click.echo(f"{'Lookup':<60}{'Queries':>9}{'Request':>9}{'Shared':>9}{'Saved':>8}")
+	for function_name, counts in sorted(stats.items()):
+		saved = counts["request_hit"] + counts["shared_hit"]
+		calls = saved + counts["miss"]
+		click.echo(
+			f"{function_name[-59:]:<60}{counts['miss']:>9}{counts['request_hit']:>9}{counts['shared_hit']:>9}"
+			f"{saved / calls:>8.0%}"
+		)
+
+
+@click.command("benchmark-in-filter")
+@click.option("--company", required=True, help="Company whose GL entries are filtered")
+@click.option("--sizes", default="10,1000,50000", help="Comma separated list lengths")
+@click.option("--runs", default=3, type=int, help="Timed runs of each case, the best one is reported")
+@pass_context
+def benchmark_in_filter(context, company, sizes="10,1000,50000", runs=3):
+	"""Time GL Entry party filters of growing length with each IN list strategy"""
+	import time
+
+	import frappe
+
+	from tally_customizations.in_filter import get_server_info, in_condition
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		sizes = [int(size) for size in sizes.split(",") if size.strip()]
+		parties = frappe.db.sql_list("""
+			SELECT DISTINCT party FROM `tabGL Entry`
+			WHERE company = %(company)s AND party IS NOT NULL AND party != ''
+			LIMIT %(limit)s
+		""", {"company": company, "limit": max(sizes)})
+
+		strategies = ["list"]
+		if frappe.db.db_type == "mariadb":
+			strategies.append("temp_table")
+			if get_server_info()[0]:
+				strategies.append("json_table")
+
+		click.echo(f"{len(parties)} real parties, the rest of each list does not match")
+		click.echo(f"{'Values':>8}  {'Strategy':<12}{'Best':>10}{'Rows':>10}{'SQL chars':>11}")
+
+		for size in sizes:
+			values_list = (parties + [f"__benchmark_{idx}" for idx in range(size)])[:size]
+			for strategy in strategies:
+				timings = []
+				for _ in range(max(runs, 1)):
+					params = {"company": company}
+					start = time.perf_counter()
+					condition = in_condition("party", values_list, "parties", params, strategy=strategy)
+					query = f"SELECT COUNT(*) FROM `tabGL Entry` WHERE company = %(company)s AND {condition}"
+					rows = frappe.db.sql(query, params)[0][0]
+					timings.append(time.perf_counter() - start)
+				# Length of the SQL as sent, the list strategy grows with every value
+				sent = len(frappe.db.last_query or "")
+				click.echo(f"{size:>8}  {strategy:<12}{min(timings):>9.3f}s{rows:>10}{sent:>11}")
+		frappe.db.rollback()
+	finally:
+		frappe.destroy()
+
+
+commands = [check_template_queries, benchmark_ledger_fetch, benchmark_ledger_totals, build_gl_cache, load_test_reports, lookup_cache_stats, benchmark_in_filter]
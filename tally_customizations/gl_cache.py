@@ -0,0 +1,310 @@
+"""
+Columnar cache of closed-period GL entries.
+
+GL entries up to a company's last Period Closing Voucher no longer change,
+yet every opening balance re-reads all of them. With "gl_columnar_cache"
+enabled in site_config.json (and NumPy installed) they are kept per company
+as memory-mapped NumPy arrays: date ordinal, account and party ids and
+debit/credit in integer minor units. Opening balances then sum the
+closed part with vectorized array operations, and the database is only asked
+for the open part.
+
+The cache follows the closing date: closing a later period appends the new
+rows, cancelling the latest closing voucher (reopening) truncates it. Any
+other change, an older closing voucher cancelled and posted again or an
+entry posted or cancelled inside a closed period, rebuilds it from scratch.
+Each cache records the signature of the closing vouchers and GL changes it
+was built from; until it has been brought up to date the reports ignore it.
+"""
+import json
+import os
+import shutil
+from functools import partial
+
+import frappe
+from frappe.utils import add_days, cint, getdate
+
+from tally_customizations.ledger_totals import to_minor_units
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+# Cached columns and their array types, rows are kept in posting_date order
+COLUMNS = {
+	"posting_date": "int32",
+	"account": "int32",
+	"party": "int32",
+	"debit": "int64",
+	"credit": "int64"
+}
+
+# Loaded caches per (site, company), the arrays are memory-mapped so this is cheap
+_caches = {}
+
+
+def is_enabled():
+	"""Check if the cache is switched on and NumPy is available"""
+	return np is not None and bool(cint(frappe.conf.get("gl_columnar_cache")))
+
+
+def get_cache_path(company):
+	"""Directory holding a company's cache files"""
+	return frappe.get_site_path("private", "gl_cache", frappe.scrub(company))
+
+
+def get_version_key(company):
+	return f"gl_cache_version|{company}"
+
+
+def get_closing_state(company):
+	"""(last day of the latest closed period or None, signature) of the company
+
+	The signature changes whenever a closing voucher is submitted or cancelled,
+	and whenever an entry inside a closed period changes (see on_gl_entry_change).
+	"""
+	closed_upto, vouchers, modified = frappe.db.sql("""
+		SELECT
+			MAX(CASE WHEN docstatus = 1 THEN period_end_date END),
+			COUNT(*),
+			MAX(modified)
+		FROM `tabPeriod Closing Voucher`
+		WHERE company = %(company)s AND docstatus > 0
+	""", {"company": company})[0]
+
+	version = frappe.cache().get_value(get_version_key(company)) or ""
+	return getdate(closed_upto) if closed_upto else None, f"{vouchers}|{modified}|{version}"
+
+
+def load_meta(path):
+	"""Closing date and id dictionaries of a cache, or None if there is none"""
+	try:
+		with open(os.path.join(path, "meta.json")) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+class GLCache:
+	"""Memory-mapped closed-period GL entries of one company"""
+
+	def __init__(self, path, meta):
+		self.closed_upto = getdate(meta["closed_upto"])
+		self.signature = meta["signature"]
+		self.columns = {
+			column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+			for column in COLUMNS
+		}
+		self.account_ids = {account: idx for idx, account in enumerate(meta["accounts"])}
+		self.party_ids = {tuple(party): idx for idx, party in enumerate(meta["parties"])}
+
+	def get_balance(self, upto, accounts=None, party_type=None, parties=None):
+		"""Debit minus credit of the cached entries posted on or before upto"""
+		# Rows are in date order, so the date range is a prefix of the arrays
+		end = int(np.searchsorted(self.columns["posting_date"], getdate(upto).toordinal(), side="right"))
+		mask = np.ones(end, dtype=bool)
+
+		if accounts is not None:
+			ids = [self.account_ids[account] for account in accounts if account in self.account_ids]
+			mask &= np.isin(self.columns["account"][:end], ids)
+
+		if parties:
+			ids = [self.party_ids[(party_type, party)] for party in parties if (party_type, party) in self.party_ids]
+			mask &= np.isin(self.columns["party"][:end], ids)
+
+		debit = int(self.columns["debit"][:end][mask].sum())
+		credit = int(self.columns["credit"][:end][mask].sum())
+		return (debit - credit) / 100
+
+
+def get_cache(company):
+	"""The company's cache if it is enabled and up to date with the closing date, else None"""
+	if not is_enabled():
+		return None
+
+	closed_upto, signature = get_closing_state(company)
+	if not closed_upto:
+		return None
+
+	key = (frappe.local.site, company)
+	cache = _caches.get(key)
+	if cache and cache.signature == signature:
+		return cache
+
+	path = get_cache_path(company)
+	meta = load_meta(path)
+	if not meta or meta.get("signature") != signature:
+		# Stale: the hooks rebuild it, the database answers meanwhile
+		return None
+
+	_caches[key] = GLCache(path, meta)
+	return _caches[key]
+
+
+def get_cached_balance(filters, accounts=None, party_type=None, parties=None):
+	"""Part of the opening balance served from the cache
+
+	Returns (balance, cached_upto): the balance of the cached entries before
+	from_date, and the last date it covers, so the database only has to add
+	entries after cached_upto. cached_upto is None when nothing is cached.
+	"""
+	from tally_customizations.parallel_query import get_companies
+
+	companies = get_companies(filters)
+	cache = get_cache(companies[0]) if len(companies) == 1 else None
+	if not cache:
+		return 0.0, None
+
+	cached_upto = min(cache.closed_upto, add_days(getdate(filters.get("from_date")), -1))
+	return cache.get_balance(cached_upto, accounts, party_type, parties), cached_upto
+
+
+def build_cache(company):
+	"""Bring the company's cache up to date with its closing date
+
+	When only the closing date moved, just the difference is read from the
+	database: rows after the old closing date are appended, and a reopened
+	period is cut off the end. Otherwise the cached rows themselves may have
+	changed and everything is read again.
+	"""
+	if np is None:
+		return
+
+	path = get_cache_path(company)
+	closed_upto, signature = get_closing_state(company)
+	_caches.pop((frappe.local.site, company), None)
+
+	if not closed_upto:
+		shutil.rmtree(path, ignore_errors=True)
+		return
+
+	meta = load_meta(path)
+	if meta and meta.get("signature") == signature:
+		return
+
+	# Caches written before signatures were recorded are rebuilt too
+	if meta and meta.get("signature") and not meta.get("dirty") \
+		and getdate(meta["closed_upto"]) != closed_upto:
+		arrays = {column: np.load(os.path.join(path, f"{column}.npy")) for column in COLUMNS}
+		# Keep the rows that are still closed, i.e. everything when a later period was closed
+		keep = int(np.searchsorted(arrays["posting_date"], closed_upto.toordinal(), side="right"))
+		arrays = {column: values[:keep] for column, values in arrays.items()}
+		after = min(getdate(meta["closed_upto"]), closed_upto)
+	else:
+		meta = {"accounts": [], "parties": []}
+		arrays = {column: np.zeros(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+		after = None
+
+	new_rows = get_closed_rows(company, after, closed_upto, meta)
+	for column, dtype in COLUMNS.items():
+		arrays[column] = np.concatenate([arrays[column], np.array(new_rows[column], dtype=dtype)])
+
+	meta["closed_upto"] = str(closed_upto)
+	meta["signature"] = signature
+	meta.pop("dirty", None)
+	save_cache(path, arrays, meta)
+
+
+def get_closed_rows(company, after, upto, meta):
+	"""Columns of the GL entries posted after `after` up to `upto`, ids added to meta"""
+	entries = frappe.db.sql(f"""
+		SELECT posting_date, account, party_type, party, debit, credit
+		FROM `tabGL Entry`
+		WHERE
+			company = %(company)s
+			AND is_cancelled = 0
+			AND posting_date <= %(upto)s
+			{"AND posting_date > %(after)s" if after else ""}
+		ORDER BY posting_date, creation
+	""", {"company": company, "after": after, "upto": upto}, as_list=1)
+
+	ids = {
+		"accounts": {value: idx for idx, value in enumerate(meta["accounts"])},
+		"parties": {tuple(value): idx for idx, value in enumerate(meta["parties"])}
+	}
+
+	def get_id(dictionary, value):
+		if value not in ids[dictionary]:
+			ids[dictionary][value] = len(meta[dictionary])
+			meta[dictionary].append(list(value) if isinstance(value, tuple) else value)
+		return ids[dictionary][value]
+
+	columns = {column: [] for column in COLUMNS}
+	for posting_date, account, party_type, party, debit, credit in entries:
+		columns["posting_date"].append(getdate(posting_date).toordinal())
+		columns["account"].append(get_id("accounts", account))
+		columns["party"].append(get_id("parties", (party_type, party)) if party else -1)
+		columns["debit"].append(to_minor_units(debit))
+		columns["credit"].append(to_minor_units(credit))
+
+	return columns
+
+
+def save_cache(path, arrays, meta):
+	"""Write the cache files, each one replaced atomically so readers never see half a file"""
+	os.makedirs(path, exist_ok=True)
+
+	for column, values in arrays.items():
+		tmp_path = os.path.join(path, f"{column}.tmp.npy")
+		np.save(tmp_path, values)
+		os.replace(tmp_path, os.path.join(path, f"{column}.npy"))
+
+	# meta.json goes last, it is what marks the cache as up to date
+	save_meta(path, meta)
+
+
+def save_meta(path, meta):
+	tmp_path = os.path.join(path, "meta.tmp.json")
+	with open(tmp_path, "w") as f:
+		json.dump(meta, f)
+	os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+
+def on_period_closing_change(doc, method=None):
+	"""Period Closing Voucher submitted or cancelled: rebuild the company's cache"""
+	if is_enabled():
+		frappe.enqueue(
+			"tally_customizations.gl_cache.build_cache",
+			company=doc.company,
+			queue="long",
+			enqueue_after_commit=True
+		)
+
+
+def on_gl_entry_change(doc, method=None):
+	"""GL Entry submitted or cancelled: drop the cache if it falls in a closed period
+
+	Once per company and request, the cancellation of a voucher posts many entries.
+	"""
+	if not is_enabled():
+		return
+
+	invalidated = frappe.flags.setdefault("gl_cache_invalidated", set())
+	if doc.company in invalidated:
+		return
+
+	closed_upto = get_closing_state(doc.company)[0]
+	if not closed_upto or getdate(doc.posting_date) > closed_upto:
+		return
+
+	invalidated.add(doc.company)
+	frappe.db.after_commit.add(partial(invalidate_cache, doc.company))
+
+
+def invalidate_cache(company):
+	"""Mark the company's cache stale everywhere and rebuild it from scratch
+
+	Runs after the commit, so a rebuild can never record the new version
+	without the entries that caused it.
+	"""
+	path = get_cache_path(company)
+	meta = load_meta(path)
+	if meta:
+		meta["dirty"] = 1
+		save_meta(path, meta)
+
+	frappe.cache().set_value(get_version_key(company), frappe.generate_hash(length=10))
+	frappe.enqueue("tally_customizations.gl_cache.build_cache", company=company, queue="long")
+
@@ -26,7 +26,10 @@ app_license = "mit"
 
 # include js, css files in header of desk.html
 # app_include_css = "/assets/tally_customizations/css/tally_customizations.css"
-# app_include_js = "/assets/tally_customizations/js/tally_customizations.js"
+app_include_js = [
+	"/assets/tally_customizations/js/report_queue.js",
+	"/assets/tally_customizations/js/compact_rows.js"
+]
 
 # include js, css files in header of web template
 # web_include_css = "/assets/tally_customizations/css/tally_customizations.css"
@@ -78,31 +81,23 @@ app_license = "mit"
 # 	"methods": "tally_customizations.utils.jinja_methods",
 # 	"filters": "tally_customizations.utils.jinja_filters"
 # }
-
-# Fixtures
-# --------
-# Load fixtures when installing app
-fixtures = [
-	{
-		"dt": "Print Format",
-		"filters": [
-			[
-				"name",
-				"in",
-				[
-					"Tally Invoice Print",
-					"Detailed Invoice Print"
-				]
-			]
-		]
-	}
-]
+jinja = {
+	"methods": [
+		"tally_customizations.invoice_print.get_invoice_pages"
+	]
+}
 
 # Installation
 # ------------
 
 # before_install = "tally_customizations.install.before_install"
-# after_install = "tally_customizations.install.after_install"
+after_install = "tally_customizations.print_format_sync.sync_print_formats"
+
+# Migration
+# ------------
+
+# Print Formats are synced from the HTML templates on disk, only when changed
+after_migrate = ["tally_customizations.print_format_sync.sync_print_formats"]
 
 # Uninstallation
 # ------------
@@ -164,6 +159,34 @@ fixtures = [
 # 	}
 # }
 
+doc_events = {
+	"Period Closing Voucher": {
+		"on_submit": "tally_customizations.gl_cache.on_period_closing_change",
+		"on_cancel": "tally_customizations.gl_cache.on_period_closing_change"
+	},
+	# Entries posted or reversed inside a closed period make the GL cache stale
+	"GL Entry": {
+		"on_submit": "tally_customizations.gl_cache.on_gl_entry_change",
+		"on_cancel": "tally_customizations.gl_cache.on_gl_entry_change"
+	},
+	# Memoized report lookups depend on these masters
+	"Price List": {
+		"on_update": "tally_customizations.lookup_cache.on_doc_change",
+		"on_trash": "tally_customizations.lookup_cache.on_doc_change",
+		"after_rename": "tally_customizations.lookup_cache.on_doc_change"
+	},
+	"Account": {
+		"on_update": "tally_customizations.lookup_cache.on_doc_change",
+		"on_trash": "tally_customizations.lookup_cache.on_doc_change",
+		"after_rename": "tally_customizations.lookup_cache.on_doc_change"
+	},
+	"Company": {
+		"on_update": "tally_customizations.lookup_cache.on_doc_change",
+		"on_trash": "tally_customizations.lookup_cache.on_doc_change",
+		"after_rename": "tally_customizations.lookup_cache.on_doc_change"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -197,6 +220,7 @@ fixtures = [
 # 	"frappe.desk.doctype.event.event.get_events": "tally_customizations.event.get_events"
 # }
 #
+
 # each overriding function accepts a `data` argument;
 # generated from the base implementation of the doctype dashboard,
 # along with any modifications made in other Frappe apps
@@ -216,7 +240,7 @@ fixtures = [
 # Request Events
 # ----------------
 # before_request = ["tally_customizations.utils.before_request"]
-# after_request = ["tally_customizations.utils.after_request"]
+after_request = ["tally_customizations.lookup_cache.flush_stats"]
 
 # Job Events
 # ----------
@@ -0,0 +1,123 @@
+"""
+IN filters for long value lists (parties, accounts).
+
+One placeholder per value makes a different SQL text for every list length,
+and past a few thousand values the parser and optimizer spend longer on the
+list than on the query. Lists up to "in_list_threshold" (site config) are
+passed as one tuple parameter. Longer lists are passed as a single JSON
+parameter joined through JSON_TABLE (MariaDB 10.6+, MySQL 8.0.4+), or on
+older servers through a temporary table filled on the query's connection.
+Either way the SQL text stays the same whatever the list length.
+"""
+import json
+import re
+
+import frappe
+from frappe.utils import cint
+
+# Lists longer than this are joined instead of listed, override with "in_list_threshold"
+IN_LIST_THRESHOLD = 500
+
+# Minimum server versions with JSON_TABLE
+MIN_MARIADB_VERSION = (10, 6)
+MIN_MYSQL_VERSION = (8, 0, 4)
+
+# Rows per INSERT when filling a temporary table
+INSERT_BATCH_SIZE = 1000
+
+STRATEGIES = ("list", "json_table", "temp_table")
+
+# JSON_TABLE support and database collation per site
+_server_info = {}
+
+
+def get_threshold():
+	return cint(frappe.conf.get("in_list_threshold")) or IN_LIST_THRESHOLD
+
+
+def check_json_table_support(version):
+	"""Check a VERSION() string such as '10.6.12-MariaDB' for JSON_TABLE support"""
+	match = re.match(r"(\d+)\.(\d+)\.(\d+)", version or "")
+	if not match:
+		return False
+
+	server_version = tuple(int(part) for part in match.groups())
+	if "mariadb" in version.lower():
+		return server_version >= MIN_MARIADB_VERSION
+	return server_version >= MIN_MYSQL_VERSION
+
+
+def get_server_info():
+	"""(supports JSON_TABLE, database collation) of the site's database server"""
+	site = frappe.local.site
+	if site not in _server_info:
+		version, collation = frappe.db.sql("SELECT VERSION(), @@collation_database")[0]
+		_server_info[site] = (check_json_table_support(version), collation)
+	return _server_info[site]
+
+
+def get_strategy(count):
+	"""How to pass a list of count values"""
+	if count <= get_threshold() or frappe.db.db_type != "mariadb":
+		return "list"
+	return "json_table" if get_server_info()[0] else "temp_table"
+
+
+def in_condition(column, values, key, params, strategy=None):
+	"""SQL condition "column IN <values>", with its parameters added to params
+
+	key names the parameter (and temporary table), it must be unique within
+	the query. strategy forces one of STRATEGIES, for benchmarking.
+	"""
+	values = list(values)
+	strategy = strategy or get_strategy(len(values))
+
+	if strategy == "json_table":
+		params[key] = json.dumps(values)
+		# JSON_TABLE strings take the connection's collation, compare in the table's
+		return f"""{column} IN (
+			SELECT CONVERT(jt.value USING utf8mb4) COLLATE {get_server_info()[1]}
+			FROM JSON_TABLE(%({key})s, '$[*]' COLUMNS (value VARCHAR(140) PATH '$')) jt
+		)"""
+
+	if strategy == "temp_table":
+		return f"{column} IN (SELECT value FROM `{fill_temp_table(key, values)}`)"
+
+	params[key] = tuple(values)
+	return f"{column} IN %({key})s"
+
+
+def fill_temp_table(key, values):
+	"""Load values into a temporary table of the current connection, returns its name
+
+	Temporary tables are private to the connection and do not commit the
+	transaction, so this is safe inside a report run. The table is created once
+	per connection and emptied on later calls: after the first fill the
+	transaction has writes, and Frappe refuses a CREATE from then on.
+	"""
+	table = f"tmp_in_{frappe.scrub(key)}"
+	if not hasattr(frappe.local, "in_filter_tables"):
+		frappe.local.in_filter_tables = set()
+
+	# A reconnect drops the connection's temporary tables
+	created = (id(getattr(frappe.db, "_conn", None)), table)
+	if created in frappe.local.in_filter_tables:
+		frappe.db.sql(f"DELETE FROM `{table}`")
+	else:
+		frappe.db.sql(f"""
+			CREATE TEMPORARY TABLE IF NOT EXISTS `{table}` (
+				value VARCHAR(140) NOT NULL PRIMARY KEY
+			) ENGINE=MEMORY
+		""")
+		frappe.db.sql(f"DELETE FROM `{table}`")
+		frappe.local.in_filter_tables.add(created)
+
+	distinct = list(dict.fromkeys(values))
+	for start in range(0, len(distinct), INSERT_BATCH_SIZE):
+		batch = distinct[start:start + INSERT_BATCH_SIZE]
+		frappe.db.sql(
+			f"INSERT INTO `{table}` (value) VALUES {', '.join(['(%s)'] * len(batch))}",
+			tuple(batch)
+		)
+
+	return table
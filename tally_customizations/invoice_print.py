@@ -0,0 +1,52 @@
+"""
+Page model for Tally Invoice Print.
+
+Invoice lines are split into pages of a fixed number of lines on the server,
+so the print format repeats the header block on every page and carries the
+running subtotal forward ("c/f" / "b/f") instead of leaving page breaks to
+the browser.
+"""
+from frappe import _dict
+from frappe.utils import flt
+
+# Invoice lines per printed page
+LINES_PER_PAGE = 12
+
+# The last page is padded with empty lines up to this many (Tally look)
+MIN_LINES = 5
+
+
+def get_invoice_pages(doc, lines_per_page=LINES_PER_PAGE):
+	"""Split the invoice items into pages with carried forward subtotals
+
+	Each page is a dict of page_no, page_count, lines (the items), sr_offset (Sl No before the
+	first line on the page), brought_forward / carried_forward (running amount, or
+	None) and empty_lines (padding rows to render after the items).
+	"""
+	items = list(doc.get("items") or [])
+	lines_per_page = max(int(lines_per_page or LINES_PER_PAGE), 1)
+	page_count = max((len(items) + lines_per_page - 1) // lines_per_page, 1)
+
+	pages = []
+	running_total = 0.0
+
+	for page_idx in range(page_count):
+		start = page_idx * lines_per_page
+		page_items = items[start:start + lines_per_page]
+		is_last = page_idx == page_count - 1
+
+		brought_forward = running_total if page_idx else None
+		for item in page_items:
+			running_total = flt(running_total + flt(item.get("amount")), 2)
+
+		pages.append(_dict({
+			"page_no": page_idx + 1,
+			"page_count": page_count,
+			"lines": page_items,
+			"sr_offset": start,
+			"brought_forward": brought_forward,
+			"carried_forward": None if is_last else running_total,
+			"empty_lines": max(MIN_LINES - len(page_items), 0) if is_last else 0
+		}))
+
+	return pages
@@ -0,0 +1,169 @@
+"""
+Server-side printing for the ledger reports.
+
+Rows are split into fixed-size pages; every page repeats the report header
+and carries the running debit/credit totals forward ("c/f" at the foot of a
+page, "b/f" at the head of the next one), the way Tally prints ledgers.
+PDFs are rendered a batch of pages at a time, so the HTML of one batch is
+held rather than that of the whole document; the report rows themselves are
+all in memory, the reports are run in full before paginating. Print HTML is
+streamed to the browser as it renders.
+"""
+import frappe
+from frappe import _, _dict
+
+from tally_customizations.ledger_totals import LedgerTotals
+
+# Transaction rows per printed page (the b/f and c/f rows come on top)
+ROWS_PER_PAGE = 35
+
+# Pages rendered to HTML and converted to PDF in one go
+PAGES_PER_BATCH = 20
+
+# Streamed print HTML is sent in chunks of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Summary rows stay with the last page instead of starting a new one
+SUMMARY_FLAGS = ("_is_subtotal", "_is_closing", "_is_total")
+
+
+def check_report_permission(report_name):
+	"""Throw unless the user may run the report the print is built from"""
+	if not frappe.get_cached_doc("Report", report_name).is_permitted():
+		frappe.throw(_("You are not permitted to run the {0} report").format(_(report_name)), frappe.PermissionError)
+
+
+def get_company_contact(company_doc):
+	"""Company phone numbers as shown in the print header ("Tel 123, 456")"""
+	numbers = [number for number in (company_doc.get("phone_no"), company_doc.get("mobile_no")) if number]
+	return f"Tel {', '.join(numbers)}" if numbers else ""
+
+
+def is_summary_row(row):
+	"""Check if the row is a Period Total / Closing Balance / Total row"""
+	return any(row.get(flag) for flag in SUMMARY_FLAGS)
+
+
+def is_regular_row(row):
+	"""Check if the row is a transaction (the rows that get a Sr No)"""
+	return not (row.get("_is_opening") or is_summary_row(row))
+
+
+def paginate_rows(data, rows_per_page=None):
+	"""Split report rows into pages with brought/carried forward totals
+
+	Without rows_per_page all rows go on a single page. Each page is a dict of
+	page_no, rows, sr_offset (Sr No of the row before the first one on the
+	page), brought_forward and carried_forward (dicts of debit/credit, or None).
+	"""
+	pages = []
+	page_rows = []
+	sr_no = sr_offset = 0
+	# Carried totals in cents, so the printed c/f matches the report's totals
+	totals = LedgerTotals()
+
+	def add_page(carried_forward):
+		brought_forward = pages[-1].carried_forward if pages else None
+		pages.append(_dict({
+			"page_no": len(pages) + 1,
+			"rows": page_rows,
+			"sr_offset": sr_offset,
+			"brought_forward": brought_forward,
+			"carried_forward": carried_forward
+		}))
+
+	for row in data:
+		# Start a new page when this one is full, but keep summary rows together
+		if rows_per_page and len(page_rows) >= rows_per_page and not is_summary_row(row):
+			add_page(_dict({"debit": totals.period_debit, "credit": totals.period_credit}))
+			page_rows = []
+			sr_offset = sr_no
+
+		page_rows.append(row)
+
+		if is_regular_row(row):
+			sr_no += 1
+
+		# Opening and transaction rows make up the carried totals
+		if not is_summary_row(row):
+			totals.add(row.get("debit"), row.get("credit"))
+
+	if page_rows or not pages:
+		add_page(None)
+
+	return pages
+
+
+def get_print_css():
+	"""The shared print stylesheet, for renderers that do not fetch /assets (PDF)"""
+	with open(frappe.get_app_path("tally_customizations", "public", "css", "ledger_print.css")) as f:
+		return f.read()
+
+
+def render_pdf(template, context, pages, pages_per_batch=PAGES_PER_BATCH):
+	"""Render pages through the template to a single PDF, one batch at a time
+
+	Only the HTML of the current batch is built, the pages and their rows are
+	all held by the caller.
+	"""
+	from frappe.utils.pdf import get_file_data_from_writer, get_pdf
+	from pypdf import PdfWriter
+
+	writer = PdfWriter()
+	# The stylesheet is inlined, the PDF renderer cannot reach the site's assets
+	context = dict(context, print_css=get_print_css())
+
+	for start in range(0, len(pages), pages_per_batch):
+		html = template.render(dict(context, pages=pages[start:start + pages_per_batch]))
+		# get_pdf appends the rendered pages to the writer
+		get_pdf(html, output=writer)
+
+	return get_file_data_from_writer(writer)
+
+
+def set_pdf_response(filename, pdf):
+	"""Send a PDF as a file download"""
+	frappe.local.response.filename = f"{filename}.pdf"
+	frappe.local.response.filecontent = pdf
+	frappe.local.response.type = "pdf"
+
+
+def stream_html(template, context, chunk_size=STREAM_CHUNK_SIZE):
+	"""Send a rendered template to the browser in chunks as it is produced
+
+	The rendered HTML is held a chunk at a time instead of as the whole document,
+	the context (the report rows) stays in memory until the response is sent.
+	The WSGI server consumes the response after the request has been torn down,
+	so the generator connects to the site again for templates that query the
+	database.
+	"""
+	from werkzeug.wrappers import Response
+
+	site = frappe.local.site
+	user = frappe.session.user
+
+	def generate():
+		needs_connection = not getattr(frappe.local, "initialised", False)
+		if needs_connection:
+			frappe.init(site=site)
+			frappe.connect()
+			frappe.set_user(user)
+
+		try:
+			buffer = []
+			buffered = 0
+			for piece in template.generate(context):
+				buffer.append(piece)
+				buffered += len(piece)
+				if buffered >= chunk_size:
+					yield "".join(buffer).encode("utf-8")
+					buffer = []
+					buffered = 0
+
+			if buffer:
+				yield "".join(buffer).encode("utf-8")
+		finally:
+			if needs_connection:
+				frappe.destroy()
+
+	return Response(generate(), mimetype="text/html", direct_passthrough=True)
@@ -0,0 +1,202 @@
+"""
+Running balances, period totals and day summaries for the ledger reports.
+
+On MariaDB 10.2+ / MySQL 8+ the database computes them with window
+functions, so any slice of a ledger comes back with correct balances and
+no Python accumulation pass. Older servers fall back to filling the same
+fields in Python.
+"""
+import re
+
+import frappe
+from frappe import _, _dict
+from frappe.utils import flt, getdate
+
+from tally_customizations.in_filter import in_condition
+from tally_customizations.ledger_totals import LedgerTotals, sum_amounts
+from tally_customizations.parallel_query import get_companies
+
+# Minimum server versions with window function support
+MIN_MARIADB_VERSION = (10, 2)
+MIN_MYSQL_VERSION = (8, 0)
+
+# Window function support per site, the server version does not change at runtime
+_window_support = {}
+
+
+def supports_window_functions():
+	"""Check if the database server supports SUM(...) OVER (...)"""
+	site = frappe.local.site
+	if site not in _window_support:
+		_window_support[site] = check_window_support(frappe.db.sql("SELECT VERSION()")[0][0])
+	return _window_support[site]
+
+
+def check_window_support(version):
+	"""Check a VERSION() string such as '10.6.12-MariaDB' against the minimum versions"""
+	match = re.match(r"(\d+)\.(\d+)", version or "")
+	if not match:
+		return False
+
+	server_version = (int(match.group(1)), int(match.group(2)))
+	if "mariadb" in version.lower():
+		return server_version >= MIN_MARIADB_VERSION
+	return server_version >= MIN_MYSQL_VERSION
+
+
+def get_balance_columns(order_by, debit="debit", credit="credit"):
+	"""SELECT columns for the running balance and period totals
+
+	order_by must match the ORDER BY of the query so balances follow the rows.
+	debit/credit may be aggregate expressions for grouped queries.
+	"""
+	return f"""
+			SUM({debit} - {credit}) OVER (ORDER BY {order_by} ROWS UNBOUNDED PRECEDING) as running_balance,
+			SUM({debit}) OVER () as period_debit,
+			SUM({credit}) OVER () as period_credit"""
+
+
+def add_running_balances(gl_entries):
+	"""Fill running_balance, period_debit and period_credit in Python (fallback path)"""
+	period_debit = period_credit = running_balance = 0.0
+
+	for gle in gl_entries:
+		period_debit += flt(gle.debit)
+		period_credit += flt(gle.credit)
+		running_balance += flt(gle.debit) - flt(gle.credit)
+		gle.running_balance = running_balance
+
+	for gle in gl_entries:
+		gle.period_debit = period_debit
+		gle.period_credit = period_credit
+
+	return gl_entries
+
+
+def get_period_totals(gl_entries):
+	"""Period debit and credit totals of entries carrying balance columns"""
+	if not gl_entries:
+		return 0.0, 0.0
+	return flt(gl_entries[0].period_debit), flt(gl_entries[0].period_credit)
+
+
+def get_account_range(account):
+	"""Nested set (lft, rgt) of a group account, None for a ledger account
+
+	Every ledger under the group has lft >= the group's lft and rgt <= its rgt,
+	so one indexed range condition replaces walking the tree.
+	"""
+	if not account:
+		return None
+	values = frappe.get_cached_value("Account", account, ["is_group", "lft", "rgt"])
+	if not values or not values[0]:
+		return None
+	return values[1], values[2]
+
+
+def get_daily_balance_columns():
+	"""Columns for the Daily Balances view of Cash Book and Banking"""
+	return [
+		{
+			"fieldname": "posting_date",
+			"label": _("Date"),
+			"fieldtype": "Data",
+			"width": 120
+		},
+		{
+			"fieldname": "particulars",
+			"label": _("Particulars"),
+			"fieldtype": "Data",
+			"width": 200
+		},
+		{
+			"fieldname": "debit",
+			"label": _("Inflow"),
+			"fieldtype": "Currency",
+			"width": 150
+		},
+		{
+			"fieldname": "credit",
+			"label": _("Outflow"),
+			"fieldtype": "Currency",
+			"width": 150
+		},
+		{
+			"fieldname": "balance",
+			"label": _("Closing Balance"),
+			"fieldtype": "Currency",
+			"width": 150
+		}
+	]
+
+
+def get_daily_balance_data(filters, account_list):
+	"""One row per day with inflow, outflow and closing balance (Tally's Daily Balances)
+
+	Entries before from_date fall into a single NULL group, which is the opening
+	balance, so the whole view is one grouped query of at most 366 + 1 rows.
+	"""
+	data = []
+	if not account_list:
+		return data
+
+	values = {
+		"companies": tuple(get_companies(filters)),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date")
+	}
+	account_condition = in_condition("account", account_list, "accounts", values)
+
+	days = frappe.db.sql(f"""
+		SELECT
+			CASE WHEN posting_date < %(from_date)s THEN NULL ELSE posting_date END as day,
+			SUM(debit) as inflow,
+			SUM(credit) as outflow
+		FROM `tabGL Entry`
+		WHERE
+			{account_condition}
+			AND company IN %(companies)s
+			AND posting_date <= %(to_date)s
+			AND is_cancelled = 0
+		GROUP BY day
+		ORDER BY day
+	""", values, as_dict=1)
+
+	# NULL sorts first, that group is everything before from_date
+	totals = LedgerTotals()
+	if days and days[0].day is None:
+		opening = days.pop(0)
+		totals = LedgerTotals(sum_amounts(opening.inflow, -flt(opening.outflow)))
+	opening_balance = totals.opening_balance
+
+	data.append(_dict({
+		"posting_date": getdate(filters.get("from_date")).strftime("%-d-%-m-%Y"),
+		"particulars": "Opening Balance",
+		"debit": 0,
+		"credit": 0,
+		"balance": opening_balance,
+		"_is_opening": True
+	}))
+
+	# Cumulative closing balance seeded from the opening balance, kept exactly in cents
+	balances = totals.add_running([day.inflow for day in days], [day.outflow for day in days])
+
+	for day, balance in zip(days, balances, strict=True):
+		data.append(_dict({
+			"posting_date": day.day.strftime("%-d-%-m-%Y"),
+			"particulars": "",
+			"debit": flt(day.inflow, 2),
+			"credit": flt(day.outflow, 2),
+			"balance": balance
+		}))
+
+	data.append(_dict({
+		"posting_date": "",
+		"particulars": "Total",
+		"debit": totals.period_debit,
+		"credit": totals.period_credit,
+		"balance": totals.closing_balance,
+		"_is_total": True
+	}))
+
+	return data
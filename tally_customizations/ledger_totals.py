@@ -0,0 +1,129 @@
+"""
+Exact ledger totals.
+
+Summing thousands of float amounts drifts by fractions of a cent, which is
+why the reports used to round every row and total. Totals are kept here in
+integer minor units (cents) instead: every amount is converted once and all
+arithmetic after that is exact. Large batches are summed with NumPy when it
+is installed.
+"""
+from frappe.utils import flt
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+# Batches at least this long are summed with NumPy
+VECTOR_THRESHOLD = 1000
+
+# Decimals kept of amount * 100 before rounding to cents, enough to undo the
+# float error of the multiplication (2.675 * 100 is 267.49999999999997)
+CENT_ERROR_DECIMALS = 6
+
+
+def to_minor_units(amount):
+	"""Amount in integer cents, halves rounded to even like Frappe's flt(amount, 2)"""
+	return round(round(flt(amount) * 100, CENT_ERROR_DECIMALS))
+
+
+def from_minor_units(amount):
+	"""Integer cents as a 2 decimal amount"""
+	return amount / 100
+
+
+def to_minor_units_array(amounts):
+	"""Amounts as a NumPy array of integer cents, rounded the same as to_minor_units"""
+	values = np.asarray([flt(amount) for amount in amounts], dtype="float64")
+	return np.rint(np.round(values * 100, CENT_ERROR_DECIMALS)).astype("int64")
+
+
+def sum_minor_units(amounts):
+	"""Sum of amounts in integer cents"""
+	if np is not None and len(amounts) >= VECTOR_THRESHOLD:
+		return int(to_minor_units_array(amounts).sum())
+	return sum(to_minor_units(amount) for amount in amounts)
+
+
+def sum_amounts(*amounts):
+	"""Exact sum of a few amounts, e.g. the cached and database parts of a balance"""
+	return from_minor_units(sum(to_minor_units(amount) for amount in amounts))
+
+
+class LedgerTotals:
+	"""Opening, period, closing and balancing totals of a ledger, kept in cents
+
+	The Tally layout: opening balance on its side, period debits and credits,
+	closing balance on the opposite side so both total columns are equal.
+	"""
+
+	def __init__(self, opening_balance=0.0):
+		self.opening = to_minor_units(opening_balance)
+		self.debit = 0
+		self.credit = 0
+
+	def add(self, debit, credit):
+		"""Add one entry"""
+		self.debit += to_minor_units(debit)
+		self.credit += to_minor_units(credit)
+
+	def add_many(self, debits, credits):
+		"""Add a batch of entries"""
+		self.debit += sum_minor_units(debits)
+		self.credit += sum_minor_units(credits)
+
+	def add_running(self, debits, credits):
+		"""Add a batch of entries, returns the closing balance after each one"""
+		balance = self.opening + self.debit - self.credit
+
+		if np is not None and len(debits) >= VECTOR_THRESHOLD:
+			debit_cents, credit_cents = to_minor_units_array(debits), to_minor_units_array(credits)
+			self.debit += int(debit_cents.sum())
+			self.credit += int(credit_cents.sum())
+			return ((balance + np.cumsum(debit_cents - credit_cents)) / 100).tolist()
+
+		balances = []
+		for debit, credit in zip(debits, credits, strict=True):
+			debit, credit = to_minor_units(debit), to_minor_units(credit)
+			self.debit += debit
+			self.credit += credit
+			balance += debit - credit
+			balances.append(from_minor_units(balance))
+		return balances
+
+	@property
+	def opening_balance(self):
+		return from_minor_units(self.opening)
+
+	@property
+	def opening_debit(self):
+		return from_minor_units(max(self.opening, 0))
+
+	@property
+	def opening_credit(self):
+		return from_minor_units(max(-self.opening, 0))
+
+	@property
+	def period_debit(self):
+		return from_minor_units(self.debit)
+
+	@property
+	def period_credit(self):
+		return from_minor_units(self.credit)
+
+	@property
+	def closing_balance(self):
+		return from_minor_units(self.opening + self.debit - self.credit)
+
+	@property
+	def total_debit(self):
+		"""Opening and period debits, plus a credit closing balance to balance the columns"""
+		closing = self.opening + self.debit - self.credit
+		return from_minor_units(max(self.opening, 0) + self.debit + max(-closing, 0))
+
+	@property
+	def total_credit(self):
+		"""Opening and period credits, plus a debit closing balance to balance the columns"""
+		closing = self.opening + self.debit - self.credit
+		return from_minor_units(max(-self.opening, 0) + self.credit + max(closing, 0))
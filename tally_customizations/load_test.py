@@ -0,0 +1,258 @@
+"""
+Concurrent-user load test for the ledger reports.
+
+Simulates a number of desk users running reports and prints against a bench
+site over HTTP, each on its own logged-in session, pausing a random think
+time between requests. The requests are drawn from a weighted mix of
+scenarios; each scenario calls one whitelisted method and can carry several
+filter sets, one of which is picked per request. While the users run, the
+database server's connection counters are sampled, so a run reports
+throughput, latency percentiles and how many connections the load held.
+
+A scenario file is a JSON list of:
+
+	{
+		"report": "Banking",
+		"filters": [{"view": "Daily Balances"}, {"account": "Bank - TC"}],
+		"weight": 3
+	}
+
+"report" runs the report, "print" renders its print HTML instead, and any
+other whitelisted method can be given as "method" with its "args". company,
+from_date and to_date missing from a filter set are taken from the command
+line.
+"""
+import json
+import math
+import random
+import threading
+import time
+
+import frappe
+
+# Scenario mix used without a scenario file: month-end Banking and Tally Ledger
+# runs with the odd Cash Book and print
+DEFAULT_SCENARIOS = [
+	{"report": "Banking", "weight": 3},
+	{"report": "Tally Ledger", "weight": 3},
+	{"report": "Cash Book", "weight": 1},
+	{"print": "Banking", "weight": 1},
+	{"print": "Tally Ledger", "weight": 1}
+]
+
+# Seconds between samples of the database connection counters
+SAMPLE_INTERVAL = 0.5
+
+REQUEST_TIMEOUT = 600
+
+
+def get_print_method(report_name):
+	"""Whitelisted print HTML method of a ledger report"""
+	module = frappe.scrub(report_name)
+	return f"tally_customizations.tally_customizations.report.{module}.{module}.stream_print_html"
+
+
+def load_scenarios(path, defaults):
+	"""Scenarios from a JSON file (or the default mix) as (label, method, [args], weight)"""
+	scenarios = DEFAULT_SCENARIOS
+	if path:
+		with open(path) as f:
+			scenarios = json.load(f)
+
+	loaded = []
+	for scenario in scenarios:
+		filter_sets = scenario.get("filters") or [{}]
+		if isinstance(filter_sets, dict):
+			filter_sets = [filter_sets]
+		filter_sets = [dict(defaults, **filters) for filters in filter_sets]
+
+		if scenario.get("report"):
+			label = scenario["report"]
+			method = "frappe.desk.query_report.run"
+			args = [{"report_name": label, "filters": json.dumps(filters)} for filters in filter_sets]
+		elif scenario.get("print"):
+			label = f"{scenario['print']} (print)"
+			method = get_print_method(scenario["print"])
+			args = [{"filters": json.dumps(filters)} for filters in filter_sets]
+		else:
+			label = scenario.get("label") or scenario["method"]
+			method = scenario["method"]
+			args = [scenario.get("args") or {}]
+
+		loaded.append((label, method, args, max(float(scenario.get("weight", 1)), 0)))
+
+	return loaded
+
+
+def percentile(values, pct):
+	"""Nearest-rank percentile of sorted values"""
+	if not values:
+		return 0.0
+	rank = max(math.ceil(pct / 100 * len(values)), 1)
+	return values[rank - 1]
+
+
+def get_connection_counters():
+	"""Connected and running threads of the database server, None if not MariaDB"""
+	if frappe.db.db_type != "mariadb":
+		return None
+
+	status = dict(frappe.db.sql("""
+		SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Threads_running')
+	"""))
+	return int(status.get("Threads_connected", 0)), int(status.get("Threads_running", 0))
+
+
+class LoadTest:
+	"""Drive the scenarios with concurrent users and collect the results"""
+
+	def __init__(self, url, scenarios, users, duration=None, requests_per_user=None,
+			think_time=1.0, ramp_up=0.0, auth=None, seed=None):
+		self.url = url.rstrip("/")
+		self.scenarios = scenarios
+		self.users = users
+		self.duration = duration
+		self.requests_per_user = requests_per_user
+		self.think_time = think_time
+		self.ramp_up = ramp_up
+		self.auth = auth or {}
+		self.random = random.Random(seed)
+
+		# (label, seconds, ok, response bytes), appended from the user threads
+		self.results = []
+		self.errors = {}
+		self.lock = threading.Lock()
+		# (connected, running) database threads, sampled during the run
+		self.baseline = None
+		self.samples = []
+
+	def get_session(self):
+		"""A requests session logged in as the load test user"""
+		import requests
+
+		session = requests.Session()
+		if self.auth.get("api_key"):
+			session.headers["Authorization"] = f"token {self.auth['api_key']}:{self.auth['api_secret']}"
+		else:
+			response = session.post(f"{self.url}/api/method/login", data={
+				"usr": self.auth.get("user"),
+				"pwd": self.auth.get("password")
+			}, timeout=REQUEST_TIMEOUT)
+			response.raise_for_status()
+		return session
+
+	def pick(self, rng):
+		"""A (label, method, args) to run next, by scenario weight"""
+		label, method, args, _ = rng.choices(self.scenarios, weights=[s[3] for s in self.scenarios])[0]
+		return label, method, rng.choice(args)
+
+	def run_user(self, index, rng, stop):
+		"""One simulated user: request, think, repeat until the run ends"""
+		if self.ramp_up:
+			time.sleep(self.ramp_up * index / max(self.users, 1))
+
+		try:
+			session = self.get_session()
+		except Exception as e:
+			self.record_error("login", e)
+			return
+
+		done = 0
+		while not stop.is_set():
+			if self.requests_per_user and done >= self.requests_per_user:
+				break
+
+			label, method, args = self.pick(rng)
+			start = time.perf_counter()
+			try:
+				response = session.post(f"{self.url}/api/method/{method}", data=args, timeout=REQUEST_TIMEOUT)
+				size = len(response.content)
+				ok = response.ok
+				if not ok:
+					self.record_error(label, f"HTTP {response.status_code}")
+			except Exception as e:
+				size, ok = 0, False
+				self.record_error(label, e)
+
+			with self.lock:
+				self.results.append((label, time.perf_counter() - start, ok, size))
+			done += 1
+
+			if self.think_time:
+				# Exponential think time, so users do not fall into lockstep
+				stop.wait(rng.expovariate(1 / self.think_time))
+
+	def record_error(self, label, error):
+		key = f"{label}: {error}"[:200]
+		with self.lock:
+			self.errors[key] = self.errors.get(key, 0) + 1
+
+	def run(self):
+		"""Run all users, sampling connection counters meanwhile; returns the elapsed seconds"""
+		stop = threading.Event()
+		started = time.perf_counter()
+		threads = [
+			threading.Thread(target=self.run_user, args=(index, random.Random(self.random.random()), stop), daemon=True)
+			for index in range(self.users)
+		]
+
+		self.baseline = get_connection_counters()
+		for thread in threads:
+			thread.start()
+
+		while any(thread.is_alive() for thread in threads):
+			if self.duration and time.perf_counter() - started >= self.duration:
+				stop.set()
+
+			counters = get_connection_counters()
+			if counters:
+				self.samples.append(counters)
+			# Do not keep the sampling transaction open between samples
+			frappe.db.rollback()
+			time.sleep(SAMPLE_INTERVAL)
+
+		stop.set()
+		for thread in threads:
+			thread.join()
+
+		return time.perf_counter() - started
+
+	def get_summary(self, elapsed):
+		"""Throughput and latency per scenario and overall, and connection usage"""
+		by_label = {}
+		for label, seconds, ok, size in self.results:
+			by_label.setdefault(label, []).append((seconds, ok, size))
+
+		def summarize(rows):
+			latencies = sorted(seconds for seconds, _, _ in rows)
+			return {
+				"requests": len(rows),
+				"errors": sum(1 for _, ok, _ in rows if not ok),
+				"throughput": len(rows) / elapsed if elapsed else 0.0,
+				"p50": percentile(latencies, 50),
+				"p95": percentile(latencies, 95),
+				"p99": percentile(latencies, 99),
+				"max": latencies[-1] if latencies else 0.0,
+				"avg_kib": sum(size for _, _, size in rows) / len(rows) / 1024 if rows else 0.0
+			}
+
+		summary = {
+			"users": self.users,
+			"elapsed": elapsed,
+			"scenarios": {label: summarize(rows) for label, rows in sorted(by_label.items())},
+			"total": summarize([(seconds, ok, size) for _, seconds, ok, size in self.results]),
+			"errors": self.errors
+		}
+
+		if self.samples:
+			connected = [sample[0] for sample in self.samples]
+			running = [sample[1] for sample in self.samples]
+			summary["connections"] = {
+				"baseline": self.baseline[0] if self.baseline else None,
+				"peak_connected": max(connected),
+				"avg_connected": sum(connected) / len(connected),
+				"peak_running": max(running),
+				"avg_running": sum(running) / len(running)
+			}
+
+		return summary
@@ -0,0 +1,131 @@
+"""
+Memo for master-data lookups of the reports.
+
+A report run asks for the same price lists, cash / bank accounts and company
+currency several times (columns, data, print). Functions decorated with
+@memoize(doctype) run once per request and argument list; later calls in the
+same request reuse the result. With "lookup_cache_ttl" (seconds) set in
+site_config.json results are also kept in Redis for that long, shared by
+all requests, and dropped as soon as a document of the doctype changes.
+
+Memoized results are shared, callers must not modify them.
+
+Hits and misses are counted per function and added up site-wide at the end
+of each request, see `bench lookup-cache-stats`.
+"""
+import functools
+
+import frappe
+from frappe.utils import cint
+
+
+def get_ttl():
+	"""Seconds results are shared across requests, 0 keeps them per request only"""
+	return max(cint(frappe.conf.get("lookup_cache_ttl")), 0)
+
+
+def get_request_memo():
+	"""The current request's memo, created on first use"""
+	if not hasattr(frappe.local, "lookup_memo"):
+		frappe.local.lookup_memo = {}
+		frappe.local.lookup_memo_stats = {}
+	return frappe.local.lookup_memo
+
+
+def count(function_name, outcome):
+	"""Count a request_hit, shared_hit or miss of a memoized function"""
+	stats = frappe.local.lookup_memo_stats.setdefault(function_name, {})
+	stats[outcome] = stats.get(outcome, 0) + 1
+
+
+def get_shared_key(doctype, function_name, args):
+	return f"lookup_memo|{doctype}|{function_name}|{args!r}"
+
+
+def memoize(doctype):
+	"""Decorator: memoize a lookup whose result depends on documents of doctype
+
+	The doctype needs an on_doc_change doc_events hook, so changes clear it.
+	"""
+
+	def decorator(function):
+		function_name = f"{function.__module__}.{function.__qualname__}"
+
+		@functools.wraps(function)
+		def wrapper(*args):
+			memo = get_request_memo()
+			key = (function_name, args)
+			if key in memo:
+				count(function_name, "request_hit")
+				return memo[key]
+
+			ttl = get_ttl()
+			if ttl:
+				shared_key = get_shared_key(doctype, function_name, args)
+				value = frappe.cache().get_value(shared_key)
+				if value is not None:
+					count(function_name, "shared_hit")
+					memo[key] = value
+					return value
+
+			count(function_name, "miss")
+			value = memo[key] = function(*args)
+			if ttl and value is not None:
+				frappe.cache().set_value(shared_key, value, expires_in_sec=ttl)
+			return value
+
+		return wrapper
+
+	return decorator
+
+
+def clear_doctype(doctype):
+	"""Drop the memoized lookups of a doctype, in this request and in Redis"""
+	memo = getattr(frappe.local, "lookup_memo", None)
+	if memo:
+		memo.clear()
+	frappe.cache().delete_keys(f"lookup_memo|{doctype}|")
+
+
+def on_doc_change(doc, method=None):
+	"""doc_events hook: a document of a memoized doctype changed"""
+	clear_doctype(doc.doctype)
+
+
+def flush_stats(*args, **kwargs):
+	"""after_request hook: add the request's hit and miss counts to the site-wide totals"""
+	stats = getattr(frappe.local, "lookup_memo_stats", None)
+	if not stats:
+		return
+
+	key = frappe.cache().make_key("lookup_memo_stats")
+	pipeline = frappe.cache().pipeline()
+	for function_name, outcomes in stats.items():
+		for outcome, hits in outcomes.items():
+			pipeline.hincrby(key, f"{function_name}|{outcome}", hits)
+	pipeline.execute()
+	frappe.local.lookup_memo_stats = {}
+
+
+def get_stats():
+	"""Site-wide {function: {"request_hit", "shared_hit", "miss"}} since the last reset"""
+	# Read through a plain pipeline, the cache wrapper's hgetall expects pickled values
+	pipeline = frappe.cache().pipeline()
+	pipeline.hgetall(frappe.cache().make_key("lookup_memo_stats"))
+
+	stats = {}
+	for field, hits in (pipeline.execute()[0] or {}).items():
+		function_name, outcome = frappe.safe_decode(field).rsplit("|", 1)
+		stats.setdefault(function_name, {"request_hit": 0, "shared_hit": 0, "miss": 0})[outcome] = cint(hits)
+	return stats
+
+
+def reset_stats():
+	frappe.cache().delete_value("lookup_memo_stats")
+
+
+@memoize("Company")
+def get_company_currency(company):
+	"""Default currency of a company, falling back to the global default"""
+	return frappe.db.get_value("Company", company, "default_currency") or \
+		frappe.defaults.get_global_default("currency")
@@ -0,0 +1,93 @@
+"""
+Narration / reference search on GL Entry remarks.
+
+The remarks carry the narration and, for payments, the cheque or reference
+number. A patch adds a FULLTEXT index on them; searches match every word
+through that index, so they combine with the date, account and party
+conditions without scanning remarks. Words shorter than the server's
+innodb_ft_min_token_size, and InnoDB stopwords, are not in the index; they
+are checked with LIKE on the rows the index already matched. A search made
+only of such words, or a site without the index, falls back to LIKE on the
+rows left by the other filters.
+"""
+import re
+
+import frappe
+from frappe.utils import cint
+
+FULLTEXT_INDEX = "remarks_fulltext"
+
+# InnoDB default for innodb_ft_min_token_size
+DEFAULT_MIN_TOKEN_SIZE = 3
+
+# InnoDB's default FULLTEXT stopwords, a required stopword would match nothing
+STOPWORDS = {
+	"a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how",
+	"i", "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+	"when", "where", "who", "will", "with", "und", "www"
+}
+
+# (has the FULLTEXT index, minimum indexed word length) per site
+_search_info = {}
+
+
+def add_fulltext_index():
+	"""Add the FULLTEXT index on GL Entry remarks (patch)
+
+	The first FULLTEXT index of a table rebuilds it, on a large GL Entry table
+	this takes a while.
+	"""
+	if frappe.db.db_type != "mariadb" or has_index():
+		return
+
+	frappe.db.sql_ddl(f"ALTER TABLE `tabGL Entry` ADD FULLTEXT INDEX `{FULLTEXT_INDEX}` (remarks)")
+	_search_info.pop(frappe.local.site, None)
+
+
+def has_index():
+	return bool(frappe.db.sql("SHOW INDEX FROM `tabGL Entry` WHERE Key_name = %s", FULLTEXT_INDEX))
+
+
+def get_search_info():
+	"""(has the FULLTEXT index, minimum indexed word length) of the site"""
+	site = frappe.local.site
+	if site not in _search_info:
+		if frappe.db.db_type != "mariadb":
+			_search_info[site] = (False, DEFAULT_MIN_TOKEN_SIZE)
+		else:
+			min_token_size = frappe.db.sql("SELECT @@innodb_ft_min_token_size")[0][0]
+			_search_info[site] = (has_index(), cint(min_token_size) or DEFAULT_MIN_TOKEN_SIZE)
+	return _search_info[site]
+
+
+def get_search_words(search):
+	"""Words of a search, punctuation such as the '-' in 'CHQ-1042' separates them"""
+	return list(dict.fromkeys(re.findall(r"\w+", (search or "").lower())))
+
+
+def search_condition(search, values, alias=""):
+	"""Condition matching remarks that contain every word of search, "" for an empty search
+
+	Its parameters are added to values.
+	"""
+	words = get_search_words(search)
+	if not words:
+		return ""
+
+	has_fulltext, min_token_size = get_search_info()
+	indexed = [
+		word for word in words
+		if has_fulltext and len(word) >= min_token_size and word not in STOPWORDS
+	]
+	conditions = []
+
+	if indexed:
+		# Every word required, as a prefix so 'chq' also finds 'chq1042'
+		values["narration_match"] = " ".join(f"+{word}*" for word in indexed)
+		conditions.append(f"MATCH({alias}remarks) AGAINST (%(narration_match)s IN BOOLEAN MODE)")
+
+	for idx, word in enumerate(word for word in words if word not in indexed):
+		values[f"narration_like_{idx}"] = "%{}%".format(word.replace("_", "\\_"))
+		conditions.append(f"{alias}remarks LIKE %(narration_like_{idx})s")
+
+	return "(" + " AND ".join(conditions) + ")"
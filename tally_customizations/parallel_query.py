@@ -0,0 +1,130 @@
+"""
+Concurrent ledger queries.
+
+Frappe keeps one database connection per request, so queries that can run
+side by side (one per company, one per date partition) are run on a small
+thread pool where every worker connects to the site on its own. Ordered
+results are combined without re-sorting: per-company streams by a k-way
+merge, non-overlapping date partitions by concatenation.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import frappe
+from frappe import _dict
+from frappe.utils import add_days, add_months, cint, get_first_day, getdate
+
+# Default worker threads (and so extra DB connections) per report run,
+# override with "ledger_query_workers" in site_config.json
+MAX_WORKERS = 4
+
+# Months per date partition when a ledger is fetched in partitions, 0 fetches
+# the period in one query; override with "ledger_partition_months"
+PARTITION_MONTHS = 0
+
+
+def get_max_workers():
+	"""Worker threads per report run"""
+	return max(cint(frappe.conf.get("ledger_query_workers")) or MAX_WORKERS, 1)
+
+
+def get_partition_months():
+	"""Months per date partition, 0 when partitioned fetching is off"""
+	return max(cint(frappe.conf.get("ledger_partition_months", PARTITION_MONTHS)), 0)
+
+
+def get_companies(filters):
+	"""Companies a ledger covers: the selected company plus any group companies"""
+	companies = [filters.get("company")]
+	for company in filters.get("companies") or []:
+		if company and company not in companies:
+			companies.append(company)
+	return companies
+
+
+def run_in_threads(function, args_list, max_workers=None):
+	"""Call function(*args) for each args on a bounded thread pool
+
+	Each call gets its own site connection as the current user. Results come
+	back in the order of args_list.
+	"""
+	site = frappe.local.site
+	sites_path = frappe.local.sites_path
+	user = frappe.session.user
+
+	def run(args):
+		frappe.init(site=site, sites_path=sites_path)
+		frappe.connect()
+		frappe.set_user(user)
+		try:
+			return function(*args)
+		finally:
+			frappe.destroy()
+
+	max_workers = min(max_workers or get_max_workers(), len(args_list))
+	if max_workers <= 1:
+		# Nothing to overlap, stay on the request's own connection
+		return [function(*args) for args in args_list]
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		return list(executor.map(run, args_list))
+
+
+def fetch_for_companies(filters, fetch, key, *args):
+	"""Run fetch(filters, *args) for every company concurrently, merged in key order
+
+	fetch must return rows sorted by key; the per-company streams are combined
+	with a k-way merge so the union is never sorted as a whole.
+	"""
+	companies = get_companies(filters)
+	if len(companies) == 1:
+		return fetch(filters, *args)
+
+	results = run_in_threads(fetch, [(_dict(filters, company=company), *args) for company in companies])
+	return list(heapq.merge(*results, key=key))
+
+
+def gl_entry_order(gle):
+	"""Sort key of GL entries in the ledger reports, the ORDER BY posting_date, account, creation, name
+
+	The database compares account names case-insensitively, so must the merge.
+	"""
+	return (gle.posting_date, (gle.account or "").casefold(), gle.creation, gle.name)
+
+
+def get_month_partitions(from_date, to_date, months):
+	"""Split from_date..to_date into consecutive (from, to) ranges of whole calendar months
+
+	The first and last ranges are cut to the period, ranges never overlap.
+	"""
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	if not months or months < 1:
+		return [(from_date, to_date)]
+
+	partitions = []
+	start = from_date
+	while start <= to_date:
+		end = min(add_days(get_first_day(add_months(start, months)), -1), to_date)
+		partitions.append((start, end))
+		start = add_days(end, 1)
+
+	return partitions
+
+
+def fetch_in_partitions(filters, fetch, *args, months=None, max_workers=None):
+	"""Run fetch(filters, *args) for every month partition of the period concurrently
+
+	fetch must order its rows by posting_date first; partitions do not overlap,
+	so their results are simply concatenated in partition order.
+	"""
+	partitions = get_month_partitions(filters.get("from_date"), filters.get("to_date"), months or get_partition_months())
+	if len(partitions) == 1:
+		return fetch(filters, *args)
+
+	results = run_in_threads(
+		fetch,
+		[(_dict(filters, from_date=start, to_date=end), *args) for start, end in partitions],
+		max_workers
+	)
+	return list(chain.from_iterable(results))
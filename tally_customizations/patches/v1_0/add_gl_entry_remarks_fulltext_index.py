@@ -0,0 +1,6 @@
+from tally_customizations.narration_search import add_fulltext_index
+
+
+def execute():
+	"""FULLTEXT index for the narration search of the Tally Ledger"""
+	add_fulltext_index()
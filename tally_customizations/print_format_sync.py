@@ -0,0 +1,135 @@
+"""
+Keep the app's Print Formats in sync with the HTML templates on disk.
+
+The templates under tally_customizations/print_format are the single source
+of truth. The hash of what was last written is kept as a global default. On
+migrate a format is only touched when its template or settings hash differs
+from that; a stored format that no longer matches the last written hash was
+edited by an administrator and is left alone.
+"""
+import hashlib
+import os
+
+import frappe
+from frappe.utils import cstr, flt
+
+# Settings shared by every print format shipped with this app
+COMMON_SETTINGS = {
+	"doc_type": "Sales Invoice",
+	"module": "Tally Customizations",
+	"standard": "No",
+	"custom_format": 1,
+	"print_format_type": "Jinja",
+	"default_print_language": "en",
+	"page_number": "Hide",
+	"disabled": 0
+}
+
+# Global default holding the last synced hash of a print format
+SYNCED_HASH_KEY = "tally_customizations_print_format_hash|{0}"
+
+# Per-format settings, keyed by Print Format name
+PRINT_FORMATS = {
+	"Tally Invoice Print": {
+		"template": "tally_invoice_print",
+		"font_size": 14,
+		"margin_top": 5,
+		"margin_bottom": 5,
+		"margin_left": 5,
+		"margin_right": 5
+	},
+	"Detailed Invoice Print": {
+		"template": "detailed_invoice_print",
+		"font_size": 9,
+		"margin_top": 10,
+		"margin_bottom": 10,
+		"margin_left": 10,
+		"margin_right": 10
+	}
+}
+
+
+def get_template_path(template):
+	"""Path of the HTML template for a print format"""
+	return os.path.join(
+		os.path.dirname(__file__),
+		"tally_customizations",
+		"print_format",
+		template,
+		f"{template}.html"
+	)
+
+
+def get_print_format_values(name):
+	"""Build the field values of a print format from its on-disk template"""
+	settings = dict(PRINT_FORMATS[name])
+	template = settings.pop("template")
+
+	with open(get_template_path(template)) as f:
+		html_content = f.read()
+
+	values = dict(COMMON_SETTINGS)
+	values.update(settings)
+	values["html"] = html_content
+
+	return values
+
+
+def get_content_hash(values):
+	"""Hash the fields owned by this app so stored and on-disk formats compare equal"""
+	content_hash = hashlib.sha256()
+
+	for fieldname in sorted(values):
+		value = values.get(fieldname)
+		# Numbers come back from the database as floats (5.0 vs 5)
+		if isinstance(value, (int, float)):
+			value = repr(flt(value))
+		content_hash.update(f"{fieldname}={cstr(value)}\0".encode())
+
+	return content_hash.hexdigest()
+
+
+def sync_print_format(name):
+	"""Create or update a single print format if its template changed
+
+	Returns True when the print format was written.
+	"""
+	values = get_print_format_values(name)
+	content_hash = get_content_hash(values)
+	synced_hash = frappe.db.get_global(SYNCED_HASH_KEY.format(name))
+
+	if content_hash == synced_hash and frappe.db.exists("Print Format", name):
+		return False
+
+	stored = frappe.db.get_value("Print Format", name, list(values), as_dict=1)
+	if stored:
+		stored_hash = get_content_hash(stored)
+		if stored_hash == content_hash:
+			frappe.db.set_global(SYNCED_HASH_KEY.format(name), content_hash)
+			return False
+
+		# Changed since the last sync, an administrator's edit wins over the template
+		if synced_hash and stored_hash != synced_hash:
+			print(f"Tally Customizations: print format {name} was edited, not updated from its template")
+			return False
+
+	if stored:
+		print_format = frappe.get_doc("Print Format", name)
+		print_format.update(values)
+		print_format.save(ignore_permissions=True)
+	else:
+		print_format = frappe.get_doc({"doctype": "Print Format", "name": name, **values})
+		print_format.insert(ignore_permissions=True)
+
+	frappe.db.set_global(SYNCED_HASH_KEY.format(name), content_hash)
+	return True
+
+
+def sync_print_formats():
+	"""Sync all print formats shipped with the app (after_install / after_migrate hook)"""
+	updated = [name for name in PRINT_FORMATS if sync_print_format(name)]
+
+	if updated:
+		print(f"Tally Customizations: updated print formats {', '.join(updated)}")
+
+	return updated
@@ -0,0 +1,64 @@
+// Compact Transfer: Tally Ledger, Cash Book and Banking can send their rows as
+// dictionary-encoded column arrays (tally_customizations.columnar.encode_rows)
+frappe.provide("tally_customizations.compact_rows");
+
+// Reports that called setup(), only their runs with Compact Transfer on are rerouted
+tally_customizations.compact_rows.reports = new Set();
+
+tally_customizations.compact_rows.decode = function(payload) {
+	// Column arrays back to row objects, dictionary-encoded fields hold indexes
+	let rows = new Array(payload.length);
+	for (let i = 0; i < payload.length; i++) {
+		let row = {};
+		payload.fields.forEach((field, f) => {
+			let value = payload.columns[f][i];
+			if (value === null || value === undefined) return;
+			let dictionary = payload.dictionaries[field];
+			row[field] = dictionary ? dictionary[value] : value;
+		});
+		rows[i] = row;
+	}
+	return rows;
+};
+
+tally_customizations.compact_rows.wants_compact = function(opts) {
+	// A run of an opted-in report with the Compact Transfer filter checked
+	if (!opts || opts.method !== "frappe.desk.query_report.run" || !opts.args) return false;
+	if (!tally_customizations.compact_rows.reports.has(opts.args.report_name)) return false;
+
+	let filters = opts.args.filters;
+	if (typeof filters === "string") {
+		try {
+			filters = JSON.parse(filters);
+		} catch (e) {
+			return false;
+		}
+	}
+	return Boolean(filters && cint(filters.compact_transfer));
+};
+
+tally_customizations.compact_rows.setup = function(report) {
+	tally_customizations.compact_rows.reports.add(report.report_name);
+
+	// The report page always calls the core runner; send compact runs to
+	// run_compact instead, the core endpoint itself is left alone
+	if (!tally_customizations.compact_rows.core_call) {
+		let core_call = frappe.call;
+		tally_customizations.compact_rows.core_call = core_call;
+		frappe.call = function(opts) {
+			if (tally_customizations.compact_rows.wants_compact(opts)) {
+				opts = Object.assign({}, opts, { method: "tally_customizations.columnar.run_compact" });
+			}
+			return core_call.apply(this, [opts].concat(Array.prototype.slice.call(arguments, 1)));
+		};
+	}
+
+	// With Compact Transfer the rows arrive as columns, decode them before the report renders
+	let prepare_report_data = report.prepare_report_data.bind(report);
+	report.prepare_report_data = function(data) {
+		if (data && data.result && data.result.compact) {
+			data.result = tally_customizations.compact_rows.decode(data.result);
+		}
+		return prepare_report_data(data);
+	};
+};
@@ -0,0 +1,14 @@
+// Heavy ledger report runs wait for a free slot when the server is busy,
+// tell the user why the report is taking longer
+frappe.realtime.on("heavy_report_queued", (data) => {
+	frappe.show_alert(
+		{
+			message: __(
+				"{0} is waiting: {1} other large reports are running. It will start as soon as one finishes.",
+				[__(data.report_name), data.running]
+			),
+			indicator: "orange",
+		},
+		15
+	);
+});
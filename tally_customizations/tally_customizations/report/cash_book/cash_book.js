@@ -11,6 +11,15 @@ frappe.query_reports["Cash Book"] = {
 			"default": frappe.defaults.get_user_default("Company"),
 			"reqd": 1
 		},
+		{
+			"fieldname": "companies",
+			"label": __("Group Companies"),
+			"fieldtype": "MultiSelectList",
+			"description": __("Other companies to include, each one is fetched concurrently"),
+			"get_data": function(txt) {
+				return frappe.db.get_link_options("Company", txt);
+			}
+		},
 		{
 			"fieldname": "from_date",
 			"label": __("From Date"),
@@ -40,6 +49,20 @@ frappe.query_reports["Cash Book"] = {
 					}
 				};
 			}
+		},
+		{
+			"fieldname": "view",
+			"label": __("View"),
+			"fieldtype": "Select",
+			"options": ["Transactions", "Daily Balances"],
+			"default": "Transactions"
+		},
+		{
+			"fieldname": "compact_transfer",
+			"label": __("Compact Transfer"),
+			"fieldtype": "Check",
+			"description": __("Send rows as compressed columns, for very large ledgers"),
+			"default": 0
 		}
 	],
 
@@ -84,7 +107,59 @@ frappe.query_reports["Cash Book"] = {
 		return value;
 	},
 
+	"refresh_new_entries": function(report) {
+		// Append the entries posted since the last run instead of re-running the whole period
+		let data = report.data || [];
+		let last_row = data.length ? data[data.length - 1] : null;
+		let filters = report.get_filter_values();
+
+		if (!last_row || !last_row._watermark || filters.view === "Daily Balances") {
+			report.refresh();
+			return;
+		}
+
+		frappe.call({
+			method: "tally_customizations.tally_customizations.report.cash_book.cash_book.get_new_entries",
+			args: {
+				filters: filters,
+				watermark: last_row._watermark
+			},
+			callback: function(r) {
+				let result = r.message;
+				if (!result || result.full_refresh) {
+					// A cancelled or back-dated entry changes rows already shown
+					report.refresh();
+					return;
+				}
+
+				// Replace the total rows, the new entries go after the last one shown
+				let rows = data.filter(row => !(row._is_subtotal || row._is_closing || row._is_total));
+				let totals = result.totals;
+				totals[totals.length - 1]._watermark = result.watermark;
+
+				report.data = rows.concat(result.rows, totals);
+				report.raw_data.result = report.data;
+				report.datatable.refresh(report.data, report.columns);
+
+				if (result.rows.length) {
+					frappe.show_alert({
+						message: __("{0} new entries", [result.rows.length]),
+						indicator: "green"
+					}, 5);
+				}
+			}
+		});
+	},
+
 	"onload": function(report) {
+		// Compact Transfer runs go to the compact endpoint, their rows are decoded before rendering
+		tally_customizations.compact_rows.setup(report);
+
+		// Cashiers keep the report open, fetch only what was posted since the last run
+		report.page.add_inner_button(__("Refresh New Entries"), function() {
+			frappe.query_reports["Cash Book"].refresh_new_entries(report);
+		});
+
 		// Add custom Print button
 		report.page.add_inner_button(__("Print Cash Book"), function() {
 			let filters = frappe.query_report.get_filter_values();
@@ -95,58 +170,24 @@ frappe.query_reports["Cash Book"] = {
 				return;
 			}
 
-			// Get company details
-			frappe.call({
-				method: "frappe.client.get",
-				args: {
-					doctype: "Company",
-					name: filters.company
-				},
-				callback: function(r) {
-					if (r.message) {
-						let company = r.message.company_name || r.message.name;
-						let company_address = r.message.address || "";
-
-						// Get company contact info (phone numbers)
-						let company_contact = "";
-						if (r.message.phone_no) {
-							company_contact = "Tel " + r.message.phone_no;
-						}
-						if (r.message.mobile_no) {
-							if (company_contact) {
-								company_contact += ", " + r.message.mobile_no;
-							} else {
-								company_contact = "Tel " + r.message.mobile_no;
-							}
-						}
-
-						// Call server-side method to render template
-						frappe.call({
-							method: "tally_customizations.tally_customizations.report.cash_book.cash_book.get_print_html",
-							args: {
-								filters: filters,
-								data: data,
-								company: company,
-								company_address: company_address,
-								company_contact: company_contact
-							},
-							callback: function(response) {
-								if (response.message) {
-									// Build print window
-									let print_window = window.open("", "_blank");
-									print_window.document.write(response.message);
-									print_window.document.close();
-
-									// Auto print after a short delay
-									setTimeout(function() {
-										print_window.print();
-									}, 500);
-								}
-							}
-						});
-					}
-				}
+			// The server streams the HTML, so the print window fills in while it renders
+			let url = "/api/method/tally_customizations.tally_customizations.report.cash_book.cash_book.stream_print_html?"
+				+ $.param({ filters: JSON.stringify(filters) });
+			let print_window = window.open(url, "_blank");
+
+			// Print once the whole document has arrived
+			print_window.addEventListener("load", function() {
+				print_window.print();
 			});
 		});
+
+		// Server-side paginated PDF with b/f and c/f totals, for periods too large to print in the browser
+		report.page.add_inner_button(__("Download PDF"), function() {
+			let filters = frappe.query_report.get_filter_values();
+			let url = "/api/method/tally_customizations.tally_customizations.report.cash_book.cash_book.download_pdf?"
+				+ $.param({ filters: JSON.stringify(filters) });
+
+			window.open(url);
+		});
 	}
-};
+};
\ No newline at end of file
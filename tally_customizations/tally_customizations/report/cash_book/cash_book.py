@@ -1,10 +1,28 @@
 # Copyright (c) 2024, Your Company and contributors
 # For license information, please see license.txt
 
+import os
+
 import frappe
 from frappe import _, _dict
-from frappe.utils import flt, getdate, fmt_money, get_datetime_str
-import os
+from frappe.utils import cint, flt, fmt_money, get_datetime_str, getdate, now_datetime
+
+from tally_customizations.admission import report_slot
+from tally_customizations.gl_cache import get_cached_balance
+from tally_customizations.in_filter import in_condition
+from tally_customizations.ledger_print import (
+	ROWS_PER_PAGE,
+	check_report_permission,
+	get_company_contact,
+	paginate_rows,
+	render_pdf,
+	set_pdf_response,
+	stream_html,
+)
+from tally_customizations.ledger_query import get_daily_balance_columns, get_daily_balance_data
+from tally_customizations.ledger_totals import LedgerTotals, sum_amounts, to_minor_units
+from tally_customizations.lookup_cache import get_company_currency, memoize
+from tally_customizations.parallel_query import fetch_for_companies, get_companies, gl_entry_order
 
 
 def execute(filters=None):
@@ -13,12 +31,22 @@ def execute(filters=None):
 		return [], []
 
 	validate_filters(filters)
-	columns = get_columns(filters)
-	data = get_data(filters)
+	if is_daily_balances(filters):
+		columns = get_daily_balance_columns()
+	else:
+		columns = get_columns(filters)
+
+	with report_slot("Cash Book", filters, account_type="Cash"):
+		data = get_data(filters)
 
 	return columns, data
 
 
+def is_daily_balances(filters):
+	"""Check if the one-line-per-day Daily Balances view is requested"""
+	return filters.get("view") == "Daily Balances"
+
+
 def validate_filters(filters):
 	"""Validate required filters"""
 	if not filters.get("company"):
@@ -85,22 +113,16 @@ def get_data(filters):
 	"""Fetch and format data for Cash Book"""
 	data = []
 
-	# Get cash accounts for the company
-	cash_accounts = get_cash_accounts(filters.get("company"))
-
-	if not cash_accounts:
-		frappe.msgprint(_("No Cash accounts found for this company"))
+	account_list = get_account_list(filters)
+	if not account_list:
 		return data
 
-	# If specific account is selected, use it; otherwise use all cash accounts
-	if filters.get("account"):
-		if filters.get("account") in cash_accounts:
-			account_list = [filters.get("account")]
-		else:
-			frappe.msgprint(_("Selected account is not a Cash account"))
-			return data
-	else:
-		account_list = cash_accounts
+	# Daily Balances: one grouped query, one row per day
+	if is_daily_balances(filters):
+		return get_daily_balance_data(filters, account_list)
+
+	# Taken before reading, entries cancelled after this make a delta refresh reload
+	checked_at = now_datetime()
 
 	# Get opening balance
 	opening_balance = get_opening_balance(filters, account_list)
@@ -129,121 +151,144 @@ def get_data(filters):
 	# Get GL entries for the period
 	gl_entries = get_gl_entries(filters, account_list)
 
-	# Track running totals - separate period from opening
-	period_debit = 0.0
-	period_credit = 0.0
+	# Opening, period, closing and balancing totals, kept exactly in cents
+	totals = LedgerTotals(opening_balance)
 
 	# Process each GL entry
-	for gle in gl_entries:
-		# Format particulars with Cr/Dr prefix (Cash Book style)
-		particulars, contra_account = format_cash_book_particulars(gle)
-
-		# Map voucher type to Tally-style names
-		vch_type = map_voucher_type(gle.get("voucher_type", ""))
-
-		# Format posting_date
-		posting_date = gle.get("posting_date")
-		if posting_date:
-			if isinstance(posting_date, str):
-				posting_date = getdate(posting_date)
-			posting_date_str = posting_date.strftime("%-d-%-m-%Y")
-		else:
-			posting_date_str = ""
-
-		# Get amounts with explicit precision to prevent multiplication
-		debit_amt = flt(gle.get("debit", 0), precision=2)
-		credit_amt = flt(gle.get("credit", 0), precision=2)
-
-		# Create row as dict
-		row = _dict({
-			"posting_date": posting_date_str,
-			"particulars": particulars,
-			"account": contra_account,
-			"vch_type": vch_type,
-			"vch_no": gle.get("voucher_no") or "",
-			"debit": debit_amt,
-			"credit": credit_amt,
-			"voucher_type": gle.get("voucher_type", ""),  # Original voucher type for linking
-			"voucher_no": gle.get("voucher_no") or ""  # Voucher number for linking
-		})
+	data.extend(get_entry_row(gle) for gle in gl_entries)
+
+	# Period totals of the whole batch at once
+	totals.add_many([gle.debit for gle in gl_entries], [gle.credit for gle in gl_entries])
+
+	data.extend(get_total_rows(totals, bool(data)))
+
+	# Where the next delta refresh carries on from
+	data[-1]["_watermark"] = get_watermark(gl_entries, opening_balance, checked_at)
+
+	return data
 
-		data.append(row)
 
-		# Update period totals
-		period_debit += debit_amt
-		period_credit += credit_amt
+def get_account_list(filters):
+	"""Cash accounts the report covers: the selected one, or all of every selected company"""
+	# Get cash accounts of every selected company
+	cash_accounts = [account for company in get_companies(filters) for account in get_cash_accounts(company)]
 
-	# Store the accurate period totals directly with explicit precision
-	# Use the accumulated values from the loop above
-	total_period_debit = flt(period_debit, precision=2)
-	total_period_credit = flt(period_credit, precision=2)
+	if not cash_accounts:
+		frappe.msgprint(_("No Cash accounts found for this company"))
+		return []
+
+	# If specific account is selected, use it; otherwise use all cash accounts
+	if filters.get("account"):
+		if filters.get("account") in cash_accounts:
+			return [filters.get("account")]
+		frappe.msgprint(_("Selected account is not a Cash account"))
+		return []
+
+	return cash_accounts
+
+
+def get_entry_row(gle):
+	"""Report row of one GL entry"""
+	# Format particulars with Cr/Dr prefix (Cash Book style)
+	particulars, contra_account = format_cash_book_particulars(gle)
+
+	# Map voucher type to Tally-style names
+	vch_type = map_voucher_type(gle.get("voucher_type", ""))
+
+	# Format posting_date
+	posting_date = gle.get("posting_date")
+	if posting_date:
+		if isinstance(posting_date, str):
+			posting_date = getdate(posting_date)
+		posting_date_str = posting_date.strftime("%-d-%-m-%Y")
+	else:
+		posting_date_str = ""
+
+	# Create row as dict
+	return _dict({
+		"posting_date": posting_date_str,
+		"particulars": particulars,
+		"account": contra_account,
+		"vch_type": vch_type,
+		"vch_no": gle.get("voucher_no") or "",
+		"debit": flt(gle.get("debit", 0)),
+		"credit": flt(gle.get("credit", 0)),
+		"voucher_type": gle.get("voucher_type", ""),  # Original voucher type for linking
+		"voucher_no": gle.get("voucher_no") or ""  # Voucher number for linking
+	})
+
+
+def get_total_rows(totals, has_entries):
+	"""Period total, closing balance and balancing total rows"""
+	rows = []
 
 	# Add period subtotal row (excluding opening balance) if there are entries
-	if data:
-		subtotal_row = _dict({
+	if has_entries:
+		rows.append(_dict({
 			"posting_date": "",
 			"particulars": "Period Total",
 			"account": "",
 			"vch_type": "",
 			"vch_no": "",
-			"debit": total_period_debit,
-			"credit": total_period_credit,
+			"debit": totals.period_debit,
+			"credit": totals.period_credit,
 			"_is_subtotal": True
-		})
-		data.append(subtotal_row)
+		}))
 
-	# Calculate closing balance: Opening + Period Debit - Period Credit
-	# Use explicit arithmetic with precision to prevent multiplication
-	opening_debit = flt(opening_balance, precision=2) if opening_balance > 0 else 0.0
-	opening_credit = flt(abs(opening_balance), precision=2) if opening_balance < 0 else 0.0
-
-	# Calculate closing with explicit types and precision
-	closing_balance = flt(opening_balance + total_period_debit - total_period_credit, precision=2)
+	# Closing balance: Opening + Period Debit - Period Credit
+	closing_balance = totals.closing_balance
 
 	# Add closing balance row with appropriate Dr/Cr prefix
-	if closing_balance > 0:
-		closing_particulars = "Dr  Closing Balance"
-	else:
-		closing_particulars = "Cr  Closing Balance"
-
-	closing_row = _dict({
+	rows.append(_dict({
 		"posting_date": "",
-		"particulars": closing_particulars,
+		"particulars": "Dr  Closing Balance" if closing_balance > 0 else "Cr  Closing Balance",
 		"account": "",
 		"vch_type": "",
 		"vch_no": "",
 		"debit": closing_balance if closing_balance > 0 else 0,
 		"credit": abs(closing_balance) if closing_balance < 0 else 0,
 		"_is_closing": True
-	})
-	data.append(closing_row)
-
-	# Calculate final totals for balancing (opening + period + closing balance on opposite side)
-	total_debit = opening_debit + total_period_debit
-	total_credit = opening_credit + total_period_credit
+	}))
 
-	# Add closing balance to opposite side to balance
-	if closing_balance < 0:
-		total_debit += abs(closing_balance)
-	else:
-		total_credit += closing_balance
-
-	# Add final total row
-	total_row = _dict({
+	# Final totals balance: opening + period + closing balance on the opposite side
+	rows.append(_dict({
 		"posting_date": "",
 		"particulars": "",
 		"account": "",
 		"vch_type": "",
 		"vch_no": "",
-		"debit": total_debit,
-		"credit": total_credit,
+		"debit": totals.total_debit,
+		"credit": totals.total_credit,
 		"_is_total": True
-	})
-	data.append(total_row)
+	}))
 
-	return data
+	return rows
+
+
+def get_watermark(gl_entries, opening_balance, checked_at, entries=None):
+	"""Where a delta refresh carries on from
+
+	The last GL Entry created (creation, name), the sort key of the last row
+	shown, the number of entries shown, the opening balance and when the
+	ledger was read.
+	"""
+	last_created = max(gl_entries, key=lambda gle: (gle.creation, gle.name), default=None)
+	return {
+		"creation": str(last_created.creation) if last_created else None,
+		"name": last_created.name if last_created else None,
+		"last_key": get_sort_key(gl_entries[-1]) if gl_entries else None,
+		"entries": len(gl_entries) if entries is None else entries,
+		"opening_balance": opening_balance,
+		"checked_at": str(checked_at)
+	}
 
 
+def get_sort_key(gle):
+	"""Ledger order of a GL entry as strings, comparable with a watermark's last_key"""
+	return [str(value) for value in gl_entry_order(gle)]
+
+
+@memoize("Account")
 def get_cash_accounts(company):
 	"""Get all Cash accounts for the company"""
 	cash_accounts = frappe.db.sql("""
@@ -264,45 +309,51 @@ def get_opening_balance(filters, account_list):
 	if not account_list:
 		return 0.0
 
-	# Create placeholders for accounts
-	account_placeholders = ', '.join([f"%(account_{idx})s" for idx in range(len(account_list))])
-
 	values = {
-		"company": filters.get("company"),
+		"companies": tuple(get_companies(filters)),
 		"from_date": filters.get("from_date")
 	}
 
-	# Add account values
-	for idx, acc in enumerate(account_list):
-		values[f"account_{idx}"] = acc
+	# One stable condition however many accounts there are
+	account_condition = in_condition("account", account_list, "accounts", values)
+
+	# Closed periods come from the columnar cache, the database adds the rest
+	cached_balance, cached_upto = get_cached_balance(filters, accounts=account_list)
+	cached_condition = ""
+	if cached_upto:
+		cached_condition = "AND posting_date > %(cached_upto)s"
+		values["cached_upto"] = cached_upto
 
 	opening = frappe.db.sql(f"""
 		SELECT
 			SUM(debit) - SUM(credit) as balance
 		FROM `tabGL Entry`
 		WHERE
-			account IN ({account_placeholders})
-			AND company = %(company)s
+			{account_condition}
+			AND company IN %(companies)s
 			AND posting_date < %(from_date)s
 			AND is_cancelled = 0
+			{cached_condition}
 	""", values, as_dict=1)
 
-	# Get the opening balance and ensure no multiplication occurs
-	opening_bal = 0.0
-	if opening and opening[0].balance is not None:
-		# Use precision=2 to ensure proper decimal handling
-		opening_bal = flt(opening[0].balance, precision=2)
+	# Cached and database parts added in cents
+	return sum_amounts(cached_balance, opening[0].balance if opening else 0)
 
-	return opening_bal
 
+def get_gl_entries(filters, account_list, after=None):
+	"""Fetch GL entries for cash accounts for the selected period with contra accounts
 
-def get_gl_entries(filters, account_list):
-	"""Fetch GL entries for cash accounts for the selected period with contra accounts"""
+	With after (a watermark), only entries created after its (creation, name).
+	"""
 	if not account_list:
 		return []
 
-	# Create placeholders for accounts
-	account_placeholders = ', '.join([f"%(account_{idx})s" for idx in range(len(account_list))])
+	# One concurrent query per company, merged in ledger order
+	return fetch_for_companies(filters, query_gl_entries, gl_entry_order, account_list, after)
+
+
+def query_gl_entries(filters, account_list, after=None):
+	"""Fetch GL entries of one company, ordered by posting_date, account, creation"""
 
 	values = {
 		"company": filters.get("company"),
@@ -310,9 +361,16 @@ def get_gl_entries(filters, account_list):
 		"to_date": filters.get("to_date")
 	}
 
-	# Add account values
-	for idx, acc in enumerate(account_list):
-		values[f"account_{idx}"] = acc
+	# One stable condition however many accounts there are
+	account_condition = in_condition("account", account_list, "accounts", values)
+
+	# Delta refresh: entries created after the watermark, (creation, name) breaks ties
+	after_condition = ""
+	if after and after.get("creation"):
+		after_condition = """AND (creation > %(after_creation)s
+			OR (creation = %(after_creation)s AND name > %(after_name)s))"""
+		values["after_creation"] = after.get("creation")
+		values["after_name"] = after.get("name") or ""
 
 	# First get all GL entries for cash accounts
 	gl_entries = frappe.db.sql(f"""
@@ -326,15 +384,18 @@ def get_gl_entries(filters, account_list):
 			debit,
 			credit,
 			against,
-			remarks
+			remarks,
+			creation,
+			name
 		FROM `tabGL Entry`
 		WHERE
-			account IN ({account_placeholders})
+			{account_condition}
 			AND company = %(company)s
 			AND posting_date >= %(from_date)s
 			AND posting_date <= %(to_date)s
 			AND is_cancelled = 0
-		ORDER BY posting_date, account, creation
+			{after_condition}
+		ORDER BY posting_date, account, creation, name
 	""", values, as_dict=1)
 
 	# Now get the actual contra accounts for each GL entry
@@ -427,41 +488,30 @@ def map_voucher_type(voucher_type):
 	return mapping.get(voucher_type, voucher_type)
 
 
-@frappe.whitelist()
-def get_print_html(filters, data, company, company_address, company_contact):
-	"""Generate HTML for printing the cash book"""
-	import json
-
-	# Parse JSON strings if needed
-	if isinstance(filters, str):
-		filters = json.loads(filters)
-	if isinstance(data, str):
-		data = json.loads(data)
-
-	# Get the template path
+def get_print_template():
+	"""Load the Cash Book print template"""
 	template_path = os.path.join(
 		os.path.dirname(__file__),
 		"cash_book_print.html"
 	)
 
-	# Read template content
-	with open(template_path, "r") as f:
+	with open(template_path) as f:
 		template_content = f.read()
 
-	# Render template with Jinja
 	from jinja2 import Template
-	template = Template(template_content)
+	return Template(template_content)
 
+
+def get_print_context(filters, data, company, company_address, company_contact):
+	"""Prepare the template context shared by the browser print and the PDF download"""
 	# Get company currency
-	company_currency = frappe.db.get_value("Company", filters.get("company"), "default_currency") or \
-		frappe.defaults.get_global_default("currency") or "USD"
+	company_currency = get_company_currency(filters.get("company")) or "USD"
 
-	# Prepare context
 	to_date = filters.get("to_date")
 	if isinstance(to_date, str):
 		to_date = getdate(to_date)
 
-	context = {
+	return {
 		"title": f"Cash Book - {company}",
 		"company": company,
 		"company_address": company_address,
@@ -474,6 +524,155 @@ def get_print_html(filters, data, company, company_address, company_contact):
 		"frappe": frappe
 	}
 
+
+@frappe.whitelist()
+def get_print_html(filters, data, company, company_address, company_contact):
+	"""Generate HTML for printing the cash book"""
+	import json
+
+	# Parse JSON strings if needed
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	if isinstance(data, str):
+		data = json.loads(data)
+
+	template = get_print_template()
+	context = get_print_context(filters, data, company, company_address, company_contact)
+
+	# Everything on one page - the browser paginates
+	context["pages"] = paginate_rows(data)
+
 	# Render and return HTML
 	html = template.render(context)
 	return html
+
+
+def get_report_print_context(filters):
+	"""Run the report server-side and prepare the print context for it"""
+	check_report_permission("Cash Book")
+	_, data = execute(filters)
+
+	company_doc = frappe.get_cached_doc("Company", filters.get("company"))
+	return get_print_context(
+		filters,
+		data,
+		company_doc.company_name or company_doc.name,
+		company_doc.get("address") or "",
+		get_company_contact(company_doc)
+	)
+
+
+@frappe.whitelist()
+def stream_print_html(filters):
+	"""Stream the print HTML to the browser while it renders"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = _dict(filters)
+
+	context = get_report_print_context(filters)
+	context["pages"] = paginate_rows(context["data"])
+
+	return stream_html(get_print_template(), context)
+
+
+@frappe.whitelist()
+def download_pdf(filters, rows_per_page=None):
+	"""Render the Cash Book server-side as a paginated PDF download"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = _dict(filters)
+
+	context = get_report_print_context(filters)
+	pages = paginate_rows(context["data"], cint(rows_per_page) or ROWS_PER_PAGE)
+	pdf = render_pdf(get_print_template(), context, pages)
+
+	set_pdf_response(f"Cash Book {filters.get('from_date')} to {filters.get('to_date')}", pdf)
+
+
+def get_period_summary(filters, account_list, since):
+	"""Entry count and debit/credit sums of the period, and if any entry was cancelled after since"""
+	values = {
+		"companies": tuple(get_companies(filters)),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date"),
+		"since": since
+	}
+	account_condition = in_condition("account", account_list, "accounts", values)
+
+	return frappe.db.sql(f"""
+		SELECT
+			SUM(CASE WHEN is_cancelled = 0 THEN 1 ELSE 0 END) as entries,
+			SUM(CASE WHEN is_cancelled = 0 THEN debit ELSE 0 END) as debit,
+			SUM(CASE WHEN is_cancelled = 0 THEN credit ELSE 0 END) as credit,
+			SUM(CASE WHEN is_cancelled = 1 AND modified > %(since)s THEN 1 ELSE 0 END) as cancelled
+		FROM `tabGL Entry`
+		WHERE
+			{account_condition}
+			AND company IN %(companies)s
+			AND posting_date >= %(from_date)s
+			AND posting_date <= %(to_date)s
+	""", values, as_dict=1)[0]
+
+
+@frappe.whitelist()
+def get_new_entries(filters, watermark):
+	"""Delta refresh: rows of GL entries created since a previous result, and the new totals
+
+	Returns {"rows", "totals", "watermark"}, or {"full_refresh": 1} when appending
+	rows is not enough: an entry of the period was cancelled, the opening
+	balance changed, a new entry sorts before rows already shown, or the rows
+	shown plus the new ones do not add up to the period's entry count.
+	"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	if isinstance(watermark, str):
+		watermark = json.loads(watermark)
+	filters = _dict(filters)
+	watermark = _dict(watermark or {})
+
+	check_report_permission("Cash Book")
+	validate_filters(filters)
+
+	if is_daily_balances(filters) or not watermark.get("checked_at") or watermark.get("entries") is None:
+		return {"full_refresh": 1}
+
+	account_list = get_account_list(filters)
+	if not account_list:
+		return {"full_refresh": 1}
+
+	checked_at = now_datetime()
+	opening_balance = get_opening_balance(filters, account_list)
+	summary = get_period_summary(filters, account_list, watermark.checked_at)
+
+	if summary.cancelled or to_minor_units(opening_balance) != to_minor_units(watermark.opening_balance):
+		return {"full_refresh": 1}
+
+	gl_entries = get_gl_entries(filters, account_list, after=watermark)
+	if gl_entries and watermark.last_key and get_sort_key(gl_entries[0]) < watermark.last_key:
+		# Back-dated entry, it belongs between rows already shown
+		return {"full_refresh": 1}
+
+	# An entry whose transaction committed after the last refresh, but with an
+	# earlier creation than the watermark, is missed by the fetch above
+	if cint(watermark.entries) + len(gl_entries) != cint(summary.entries):
+		return {"full_refresh": 1}
+
+	# Totals of the whole period from the sums, the rows shown are not re-read
+	totals = LedgerTotals(opening_balance)
+	totals.add(summary.debit, summary.credit)
+
+	new_watermark = get_watermark(gl_entries, opening_balance, checked_at, cint(summary.entries))
+	if not gl_entries:
+		new_watermark.update({"creation": watermark.creation, "name": watermark.name, "last_key": watermark.last_key})
+
+	return {
+		"rows": [get_entry_row(gle) for gle in gl_entries],
+		"totals": get_total_rows(totals, bool(opening_balance or summary.entries)),
+		"watermark": new_watermark
+	}
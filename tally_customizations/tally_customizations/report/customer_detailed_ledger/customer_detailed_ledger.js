@@ -26,19 +26,35 @@ frappe.query_reports["Customer Detailed Ledger"] = {
 			"reqd": 1
 		},
 		{
-			"fieldname": "customer",
-			"label": __("Customer"),
-			"fieldtype": "Link",
-			"options": "Customer",
+			"fieldname": "party_type",
+			"label": __("Party Type"),
+			"fieldtype": "Select",
+			"options": ["Customer", "Supplier", "Employee"],
+			"default": "Customer",
+			"reqd": 1,
+			"on_change": function() {
+				frappe.query_report.set_filter_value("party", "");
+			}
+		},
+		{
+			"fieldname": "party",
+			"label": __("Party"),
+			"fieldtype": "Dynamic Link",
+			"options": "party_type",
 			"get_query": function() {
-				let company = frappe.query_report.get_filter_value('company');
+				let party_type = frappe.query_report.get_filter_value("party_type");
+				// Employees are filtered by status, customers and suppliers by disabled
 				return {
-					"filters": {
-						"disabled": 0
-					}
+					"filters": party_type === "Employee" ? { "status": "Active" } : { "disabled": 0 }
 				};
 			},
 			"reqd": 1
+		},
+		{
+			"fieldname": "load_in_pages",
+			"label": __("Load in Pages"),
+			"fieldtype": "Check",
+			"default": 0
 		}
 	],
 
@@ -54,6 +70,14 @@ frappe.query_reports["Customer Detailed Ledger"] = {
 			</a>`;
 		}
 
+		// Invoice rows only carry an item count, the items are fetched when clicked
+		if (column.fieldname === "item_count" && data && data.item_count) {
+			return `<a style="color: #2490ef; cursor: pointer;"
+				onclick="frappe.query_reports['Customer Detailed Ledger'].show_items('${data.voucher_type}', '${data.voucher_no}')">
+				${value}
+			</a>`;
+		}
+
 		// Highlight opening balance row
 		if (data && data._is_opening) {
 			return `<span style="font-weight: bold;">${value}</span>`;
@@ -76,6 +100,78 @@ frappe.query_reports["Customer Detailed Ledger"] = {
 		return value;
 	},
 
+	"after_datatable_render": function(datatable) {
+		// With "Load in Pages", fetch the next page when scrolled near the bottom
+		let scrollable = datatable.bodyScrollable;
+		if (!scrollable || scrollable.dataset.pagedLedger) return;
+		scrollable.dataset.pagedLedger = 1;
+
+		scrollable.addEventListener("scroll", function() {
+			if (scrollable.scrollTop + scrollable.clientHeight >= scrollable.scrollHeight - 200) {
+				frappe.query_reports["Customer Detailed Ledger"].load_next_page();
+			}
+		});
+	},
+
+	"load_next_page": function() {
+		let data = frappe.query_report.data;
+		let last_row = data && data.length ? data[data.length - 1] : null;
+
+		// Only the last row of a full page carries a cursor
+		if (!last_row || !last_row._cursor || this.loading_page) return;
+		this.loading_page = true;
+
+		let me = this;
+		frappe.call({
+			method: "tally_customizations.tally_customizations.report.customer_detailed_ledger.customer_detailed_ledger.get_next_page",
+			args: {
+				filters: frappe.query_report.get_filter_values(),
+				cursor: last_row._cursor
+			},
+			callback: function(r) {
+				delete last_row._cursor;
+				if (r.message && r.message.length) {
+					data.push(...r.message);
+					frappe.query_report.datatable.appendRows(r.message);
+				}
+			},
+			always: function() {
+				me.loading_page = false;
+			}
+		});
+	},
+
+	"show_items": function(voucher_type, voucher_no) {
+		frappe.call({
+			method: "tally_customizations.tally_customizations.report.customer_detailed_ledger.customer_detailed_ledger.get_items",
+			args: { voucher_nos: [voucher_no], voucher_type: voucher_type },
+			callback: function(r) {
+				let items = (r.message && r.message[voucher_no]) || [];
+				let rows = items.map((item, idx) => `<tr>
+					<td>${idx + 1}</td>
+					<td>${frappe.utils.escape_html(item.item_name || "")} ${frappe.utils.escape_html(item.item_code || "")}</td>
+					<td class="text-right">${format_number(item.qty)} ${item.uom || ""}</td>
+					<td class="text-right">${format_currency(item.rate)}</td>
+					<td class="text-right">${format_currency(item.discount_amount || 0)}</td>
+					<td class="text-right">${format_currency(item.amount)}</td>
+				</tr>`).join("");
+
+				let dialog = new frappe.ui.Dialog({
+					title: voucher_no,
+					size: "large",
+					fields: [{ fieldtype: "HTML", fieldname: "items" }]
+				});
+				dialog.fields_dict.items.$wrapper.html(`<table class="table table-bordered table-condensed">
+					<thead><tr><th>#</th><th>${__("Product")}</th><th class="text-right">${__("Quantity")}</th>
+						<th class="text-right">${__("Unit Price")}</th><th class="text-right">${__("Discount")}</th>
+						<th class="text-right">${__("Subtotal")}</th></tr></thead>
+					<tbody>${rows}</tbody>
+				</table>`);
+				dialog.show();
+			}
+		});
+	},
+
 	"onload": function(report) {
 		// Add custom Print button
 		report.page.add_inner_button(__("Print Statement"), function() {
@@ -87,31 +183,19 @@ frappe.query_reports["Customer Detailed Ledger"] = {
 				return;
 			}
 
-			if (!filters.customer) {
-				frappe.msgprint(__("Please select a customer"));
+			if (!filters.party) {
+				frappe.msgprint(__("Please select a party"));
 				return;
 			}
 
-			// Call server-side method to render template
-			frappe.call({
-				method: "tally_customizations.tally_customizations.report.customer_detailed_ledger.customer_detailed_ledger.get_print_html",
-				args: {
-					filters: filters,
-					data: data
-				},
-				callback: function(response) {
-					if (response.message) {
-						// Build print window
-						let print_window = window.open("", "_blank");
-						print_window.document.write(response.message);
-						print_window.document.close();
-
-						// Auto print after a short delay
-						setTimeout(function() {
-							print_window.print();
-						}, 500);
-					}
-				}
+			// The server streams the HTML, so the print window fills in while it renders
+			let url = "/api/method/tally_customizations.tally_customizations.report.customer_detailed_ledger.customer_detailed_ledger.stream_print_html?"
+				+ $.param({ filters: JSON.stringify(filters) });
+			let print_window = window.open(url, "_blank");
+
+			// Print once the whole statement has arrived
+			print_window.addEventListener("load", function() {
+				print_window.print();
 			});
 		});
 	}
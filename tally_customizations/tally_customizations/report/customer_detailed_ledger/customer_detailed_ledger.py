@@ -1,9 +1,25 @@
 # Copyright (c) 2024, Tally Customizations and contributors
 # For license information, please see license.txt
 
+import base64
+import json
+
 import frappe
 from frappe import _
-from frappe.utils import flt, formatdate, getdate
+from frappe.utils import cint, flt, formatdate, getdate
+
+from tally_customizations.admission import report_slot
+from tally_customizations.ledger_print import check_report_permission, stream_html
+from tally_customizations.ledger_query import (
+	add_running_balances,
+	get_balance_columns,
+	supports_window_functions,
+)
+from tally_customizations.lookup_cache import get_company_currency
+from tally_customizations.voucher_enrichers import INVOICE_ITEM_DOCTYPES, enrich_vouchers
+
+# Vouchers per page when the ledger is loaded in pages
+PAGE_LENGTH = 500
 
 
 def execute(filters=None):
@@ -12,7 +28,9 @@ def execute(filters=None):
 
 	validate_filters(filters)
 	columns = get_columns()
-	data = get_data(filters)
+
+	with report_slot("Customer Detailed Ledger", filters):
+		data = get_data(filters, page_length=PAGE_LENGTH if filters.get("load_in_pages") else None)
 
 	return columns, data
 
@@ -22,8 +40,16 @@ def validate_filters(filters):
 	if not filters.get("company"):
 		frappe.throw(_("Please select a Company"))
 
-	if not filters.get("customer"):
-		frappe.throw(_("Please select a Customer"))
+	# Links saved before the party filters only have a customer
+	if not filters.get("party") and filters.get("customer"):
+		filters["party_type"] = "Customer"
+		filters["party"] = filters.get("customer")
+
+	if not filters.get("party_type"):
+		filters["party_type"] = "Customer"
+
+	if not filters.get("party"):
+		frappe.throw(_("Please select a {0}").format(_(filters.get("party_type"))))
 
 	if not filters.get("from_date"):
 		frappe.throw(_("Please select From Date"))
@@ -82,6 +108,12 @@ def get_columns():
 			"fieldtype": "Currency",
 			"width": 120
 		},
+		{
+			"label": _("Items"),
+			"fieldname": "item_count",
+			"fieldtype": "Int",
+			"width": 70
+		},
 		{
 			"label": _("Payment Method"),
 			"fieldname": "payment_method",
@@ -97,25 +129,81 @@ def get_columns():
 	]
 
 
-def get_data(filters):
+def get_data(filters, cursor=None, page_length=None):
+	"""Ledger rows with a running balance
+
+	With page_length only that many vouchers are returned, and the last row carries
+	a `_cursor` to continue from. Passing it back as cursor returns the next page,
+	continuing the running balance without re-reading earlier rows.
+	"""
 	from_date = filters.get("from_date")
-	to_date = filters.get("to_date")
-	customer = filters.get("customer")
+	party_type = filters.get("party_type")
+	party = filters.get("party")
 	company = filters.get("company")
 
 	data = []
-	balance = 0
+	position = decode_cursor(cursor) if cursor else None
+
+	# Get currency, employees have no default currency of their own
+	party_currency = None
+	if frappe.get_meta(party_type).has_field("default_currency"):
+		party_currency = frappe.db.get_value(party_type, party, "default_currency")
+	currency = party_currency or get_company_currency(company) or "UGX"
+
+	if position:
+		# Continue from the balance at the end of the previous page
+		balance = flt(position.get("balance"))
+	else:
+		# Get opening balance
+		opening_balance = get_opening_balance(party_type, party, from_date, company)
+		balance = opening_balance
+
+		# Add opening balance row
+		data.append(get_opening_row(from_date, opening_balance, currency))
+
+	gl_entries = get_gl_entries(filters, position, page_length)
+	start_balance = balance
+
+	# Voucher details, one query per voucher type for the whole page
+	voucher_details = enrich_vouchers(gl_entries)
+
+	# Process GL entries
+	for gle in gl_entries:
+		debit_amt = flt(gle.debit)
+		credit_amt = flt(gle.credit)
+		balance = start_balance + flt(gle.running_balance)
+
+		# Voucher types without an enricher show their name as the type
+		details = voucher_details.get((gle.voucher_type, gle.voucher_no), {})
+
+		data.append({
+			"posting_date": formatdate(gle.posting_date, "dd/MM/yyyy"),
+			"ref_no": gle.voucher_no,
+			"type": details.get("type") or gle.voucher_type,
+			"location": details.get("location", ""),
+			"payment_status": details.get("payment_status", ""),
+			"debit": debit_amt,
+			"credit": credit_amt,
+			"balance": abs(balance),
+			"balance_type": "DR" if balance >= 0 else "CR",
+			"payment_method": details.get("payment_method", ""),
+			"notes": details.get("notes", ""),
+			"currency": currency,
+			"item_count": details.get("item_count", 0),
+			"voucher_type": gle.voucher_type,
+			"voucher_no": gle.voucher_no
+		})
 
-	# Get opening balance
-	opening_balance = get_opening_balance(customer, from_date, company)
-	balance = opening_balance
+	# A full page means there may be more, the last row carries where to continue
+	if page_length and len(gl_entries) == page_length:
+		data[-1]["_cursor"] = encode_cursor(gl_entries[-1], balance)
+
+	return data
 
-	# Get currency
-	currency = frappe.db.get_value("Customer", customer, "default_currency") or \
-		frappe.db.get_value("Company", company, "default_currency") or "UGX"
 
-	# Add opening balance row
-	data.append({
+def get_opening_row(from_date, opening_balance, currency):
+	"""Opening balance row shown at the top of the ledger"""
+	return {
 		"posting_date": formatdate(from_date, "dd/MM/yyyy"),
 		"ref_no": "",
 		"type": "Opening Balance",
@@ -123,116 +211,213 @@ def get_data(filters):
 		"payment_status": "",
 		"debit": opening_balance if opening_balance > 0 else 0,
 		"credit": abs(opening_balance) if opening_balance < 0 else 0,
-		"balance": abs(balance),
-		"balance_type": "DR" if balance >= 0 else "CR",
+		"balance": abs(opening_balance),
+		"balance_type": "DR" if opening_balance >= 0 else "CR",
 		"payment_method": "",
 		"notes": "",
 		"currency": currency,
 		"_is_opening": True
-	})
+	}
+
+
+def get_gl_entries(filters, position=None, page_length=None):
+	"""Get GL entries grouped by voucher so each Payment Entry / Sales Invoice
+	appears exactly once with its total debit and credit amounts.
+
+	Vouchers are ordered by (posting_date, creation, voucher); with a position
+	only the vouchers after it are returned (keyset pagination).
+	"""
+	values = {
+		"party_type": filters.get("party_type"),
+		"party": filters.get("party"),
+		"company": filters.get("company"),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date")
+	}
+
+	conditions = ""
+	having = ""
+	if position:
+		# Earlier dates are pruned by the index, ties on the date by HAVING
+		conditions = "AND posting_date >= %(cursor_date)s"
+		having = """
+		HAVING
+			posting_date > %(cursor_date)s
+			OR (posting_date = %(cursor_date)s AND (
+				MIN(creation) > %(cursor_creation)s
+				OR (MIN(creation) = %(cursor_creation)s
+					AND (voucher_type, voucher_no) > (%(cursor_voucher_type)s, %(cursor_voucher_no)s))
+			))"""
+		values.update({
+			"cursor_date": position.get("posting_date"),
+			"cursor_creation": position.get("creation"),
+			"cursor_voucher_type": position.get("voucher_type"),
+			"cursor_voucher_no": position.get("voucher_no")
+		})
 
-	# Get GL entries grouped by voucher so each Payment Entry / Sales Invoice
-	# appears exactly once with its total debit and credit amounts.
-	gl_entries = frappe.db.sql("""
+	limit = ""
+	if page_length:
+		limit = "LIMIT %(page_length)s"
+		values["page_length"] = cint(page_length)
+
+	# Running balance is computed by the database where supported; the window
+	# is evaluated before LIMIT, so a page continues the balance of its cursor
+	balance_columns = ""
+	if supports_window_functions():
+		balance_columns = "," + get_balance_columns(
+			"posting_date, MIN(creation), voucher_type, voucher_no",
+			debit="SUM(debit)",
+			credit="SUM(credit)"
+		)
+
+	gl_entries = frappe.db.sql(f"""
 		SELECT
 			posting_date,
 			voucher_type,
 			voucher_no,
+			MIN(creation) as creation,
 			SUM(debit) as debit,
-			SUM(credit) as credit
+			SUM(credit) as credit{balance_columns}
 		FROM `tabGL Entry`
 		WHERE
-			party_type = 'Customer'
-			AND party = %(customer)s
+			party_type = %(party_type)s
+			AND party = %(party)s
 			AND company = %(company)s
 			AND posting_date BETWEEN %(from_date)s AND %(to_date)s
 			AND is_cancelled = 0
+			{conditions}
 		GROUP BY voucher_type, voucher_no, posting_date
-		ORDER BY posting_date, MIN(creation)
-	""", {
-		"customer": customer,
-		"company": company,
-		"from_date": from_date,
-		"to_date": to_date
-	}, as_dict=1)
+		{having}
+		ORDER BY posting_date, MIN(creation), voucher_type, voucher_no
+		{limit}
+	""", values, as_dict=1)
 
-	# Process GL entries
-	for gle in gl_entries:
-		debit_amt = flt(gle.debit)
-		credit_amt = flt(gle.credit)
-		balance += debit_amt - credit_amt
-
-		row_type = ""
-		location = ""
-		payment_status = ""
-		payment_method = ""
-		notes = ""
-		items = []
-
-		# Get voucher details
-		if gle.voucher_type == "Sales Invoice":
-			invoice = frappe.get_doc("Sales Invoice", gle.voucher_no)
-			row_type = "Invoice"
-			location = invoice.set_warehouse or ""
-			payment_status = "Paid" if invoice.status == "Paid" else "NOT PAID"
-			notes = "NOT PAID" if invoice.status != "Paid" else ""
-
-			# Get invoice items
-			items = frappe.get_all(
-				"Sales Invoice Item",
-				filters={"parent": gle.voucher_no},
-				fields=["item_code", "item_name", "qty", "rate", "amount", "discount_amount", "uom"],
-				order_by="idx"
-			)
-
-		elif gle.voucher_type == "Payment Entry":
-			payment = frappe.db.get_value(
-				"Payment Entry", gle.voucher_no,
-				["mode_of_payment", "reference_no", "remarks"],
-				as_dict=1
-			)
-			row_type = "Payment"
-			payment_method = (payment.mode_of_payment or "Bank Transfer") if payment else "Bank Transfer"
-			notes = (payment.reference_no or "Payment received") if payment else "Payment received"
-
-		else:
-			row_type = gle.voucher_type
+	# Older database servers: fill the same fields in Python
+	if not balance_columns:
+		add_running_balances(gl_entries)
 
-		data.append({
-			"posting_date": formatdate(gle.posting_date, "dd/MM/yyyy"),
-			"ref_no": gle.voucher_no,
-			"type": row_type,
-			"location": location,
-			"payment_status": payment_status,
-			"debit": debit_amt,
-			"credit": credit_amt,
-			"balance": abs(balance),
-			"balance_type": "DR" if balance >= 0 else "CR",
-			"payment_method": payment_method,
-			"notes": notes,
-			"currency": currency,
-			"items": items,
-			"voucher_type": gle.voucher_type,
-			"voucher_no": gle.voucher_no
-		})
+	return gl_entries
 
-	return data
+
+def encode_cursor(gle, balance):
+	"""Encode the position after a voucher and the running balance at that point"""
+	position = {
+		"posting_date": str(gle.posting_date),
+		"creation": str(gle.creation),
+		"voucher_type": gle.voucher_type,
+		"voucher_no": gle.voucher_no,
+		"balance": balance
+	}
+	return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+	"""Decode a cursor returned with the previous page"""
+	try:
+		return frappe._dict(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+	except ValueError:
+		frappe.throw(_("Invalid ledger cursor, please refresh the report"))
+
+
+@frappe.whitelist()
+def get_next_page(filters, cursor):
+	"""Next page of the ledger after the cursor, continuing its running balance"""
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = frappe._dict(filters)
+
+	validate_filters(filters)
+	check_report_permission("Customer Detailed Ledger")
+
+	return get_data(filters, cursor=cursor, page_length=PAGE_LENGTH)
+
+
+def get_invoice_items(voucher_type, invoices):
+	"""Items of many Sales / Purchase Invoices in one query, as {invoice: [items]}"""
+	items = {}
+	if not invoices:
+		return items
+
+	for item in frappe.db.sql(f"""
+		SELECT parent, item_code, item_name, qty, rate, amount, discount_amount, uom
+		FROM `tab{INVOICE_ITEM_DOCTYPES[voucher_type]}`
+		WHERE parent IN %(invoices)s AND parenttype = %(voucher_type)s
+		ORDER BY parent, idx
+	""", {"voucher_type": voucher_type, "invoices": tuple(set(invoices))}, as_dict=1):
+		items.setdefault(item.pop("parent"), []).append(item)
+
+	return items
+
+
+def get_items_loader(data):
+	"""Template helper returning the items of an invoice row
+
+	Nothing is fetched unless the template asks; the first call fetches the
+	items of every invoice in data, one query per invoice type.
+	"""
+	items = None
+
+	def get_row_items(row):
+		nonlocal items
+		if items is None:
+			items = {}
+			for voucher_type in INVOICE_ITEM_DOCTYPES:
+				invoices = [r.get("voucher_no") for r in data if r.get("voucher_type") == voucher_type]
+				for invoice, invoice_items in get_invoice_items(voucher_type, invoices).items():
+					items[(voucher_type, invoice)] = invoice_items
+		return items.get((row.get("voucher_type"), row.get("voucher_no")), [])
+
+	return get_row_items
 
 
-def get_opening_balance(customer, from_date, company):
-	"""Get the opening balance for the customer before the from_date"""
+@frappe.whitelist()
+def get_items(voucher_nos, voucher_type="Sales Invoice"):
+	"""Items of one or many invoices of the ledger, fetched when a row is expanded"""
+	if isinstance(voucher_nos, str):
+		voucher_nos = json.loads(voucher_nos) if voucher_nos.startswith("[") else [voucher_nos]
+
+	if voucher_type not in INVOICE_ITEM_DOCTYPES:
+		frappe.throw(_("Items can only be shown for {0}").format(", ".join(INVOICE_ITEM_DOCTYPES)))
+
+	check_report_permission("Customer Detailed Ledger")
+	frappe.has_permission(voucher_type, "read", throw=True)
+
+	# Every invoice asked for, not just the doctype, a user may be limited to some customers
+	for voucher_no in voucher_nos:
+		frappe.has_permission(voucher_type, "read", voucher_no, throw=True)
+
+	return get_invoice_items(voucher_type, voucher_nos)
+
+
+def get_party_details(filters):
+	"""Name and mobile number of the party for the statement header"""
+	party_type = filters.get("party_type") or "Customer"
+	party = filters.get("party") or filters.get("customer")
+	name_field = {"Customer": "customer_name", "Supplier": "supplier_name", "Employee": "employee_name"}.get(party_type)
+
+	party_doc = frappe.get_cached_doc(party_type, party)
+	return frappe._dict({
+		"label": _(party_type),
+		"party_name": (party_doc.get(name_field) if name_field else None) or party_doc.name,
+		"mobile_no": party_doc.get("mobile_no") or party_doc.get("cell_number") or ""
+	})
+
+
+def get_opening_balance(party_type, party, from_date, company):
+	"""Get the opening balance for the party before the from_date"""
 	opening = frappe.db.sql("""
 		SELECT
 			SUM(debit) - SUM(credit) as balance
 		FROM `tabGL Entry`
 		WHERE
-			party_type = 'Customer'
-			AND party = %(customer)s
+			party_type = %(party_type)s
+			AND party = %(party)s
 			AND company = %(company)s
 			AND posting_date < %(from_date)s
 			AND is_cancelled = 0
 	""", {
-		"customer": customer,
+		"party_type": party_type,
+		"party": party,
 		"company": company,
 		"from_date": from_date
 	}, as_dict=1)
@@ -240,18 +425,8 @@ def get_opening_balance(customer, from_date, company):
 	return flt(opening[0].balance) if opening and opening[0].balance else 0.0
 
 
-@frappe.whitelist()
-def get_print_html(filters, data):
-	"""Generate HTML for printing the customer detailed ledger"""
-	import json
-
-	# Parse filters and data if they're strings
-	if isinstance(filters, str):
-		filters = json.loads(filters)
-	if isinstance(data, str):
-		data = json.loads(data)
-
-	# Get the HTML template
+def get_print_template():
+	"""Load the statement print template"""
 	template_path = frappe.get_app_path(
 		"tally_customizations",
 		"tally_customizations",
@@ -260,22 +435,36 @@ def get_print_html(filters, data):
 		"customer_detailed_ledger.html"
 	)
 
-	with open(template_path, "r") as f:
+	with open(template_path) as f:
 		template_content = f.read()
 
-	# Render the template with data
 	from jinja2 import Template
-	template = Template(template_content)
+	return Template(template_content)
 
-	# Get company info
-	company = filters.get("company")
-	customer = filters.get("customer")
 
-	html = template.render(
-		filters=filters,
-		data=data,
-		company=company,
-		frappe=frappe
-	)
+@frappe.whitelist()
+def stream_print_html(filters):
+	"""Stream the statement HTML to the browser while it renders
 
-	return html
+	Invoices are printed with their items, so the full statement can run to tens
+	of megabytes of HTML; streaming sends it in chunks instead of building it
+	whole. The statement rows are still all fetched before rendering starts.
+	"""
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = frappe._dict(filters)
+
+	check_report_permission("Customer Detailed Ledger")
+
+	# The statement always covers the whole period
+	filters.pop("load_in_pages", None)
+	_, data = execute(filters)
+
+	return stream_html(get_print_template(), {
+		"filters": filters,
+		"data": data,
+		"company": filters.get("company"),
+		"party": get_party_details(filters),
+		"get_row_items": get_items_loader(data),
+		"frappe": frappe
+	})
@@ -5,6 +5,8 @@ import frappe
 from frappe import _
 from frappe.utils import flt
 
+from tally_customizations.lookup_cache import memoize
+
 
 def execute(filters=None):
 	if not filters:
@@ -70,6 +72,7 @@ def get_columns(filters):
 	return columns
 
 
+@memoize("Price List")
 def get_price_list_currency(price_list):
 	"""Get the currency of a price list"""
 	currency = frappe.db.get_value("Price List", price_list, "currency")
@@ -83,12 +86,7 @@ def get_buying_price_lists(filters):
 		return [pl] if isinstance(pl, str) else list(pl)
 
 	# Get all price lists marked for buying
-	return frappe.get_all(
-		"Price List",
-		filters={"buying": 1, "enabled": 1},
-		pluck="name",
-		order_by="name"
-	)
+	return get_enabled_price_lists("buying")
 
 
 def get_selling_price_lists(filters):
@@ -98,9 +96,15 @@ def get_selling_price_lists(filters):
 		return [pl] if isinstance(pl, str) else list(pl)
 
 	# Get all price lists marked for selling
+	return get_enabled_price_lists("selling")
+
+
+@memoize("Price List")
+def get_enabled_price_lists(side):
+	"""Enabled price lists marked for buying or selling (side)"""
 	return frappe.get_all(
 		"Price List",
-		filters={"selling": 1, "enabled": 1},
+		filters={side: 1, "enabled": 1},
 		pluck="name",
 		order_by="name"
 	)
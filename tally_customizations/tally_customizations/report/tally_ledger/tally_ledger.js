@@ -11,6 +11,15 @@ frappe.query_reports["Tally Ledger"] = {
 			"default": frappe.defaults.get_user_default("Company"),
 			"reqd": 1
 		},
+		{
+			"fieldname": "companies",
+			"label": __("Group Companies"),
+			"fieldtype": "MultiSelectList",
+			"description": __("Other companies to include, each one is fetched concurrently"),
+			"get_data": function(txt) {
+				return frappe.db.get_link_options("Company", txt);
+			}
+		},
 		{
 			"fieldname": "from_date",
 			"label": __("From Date"),
@@ -32,10 +41,10 @@ frappe.query_reports["Tally Ledger"] = {
 			"options": "Account",
 			"get_query": function() {
 				let company = frappe.query_report.get_filter_value('company');
+				// Group accounts show every ledger under them
 				return {
 					"filters": {
-						"company": company,
-						"is_group": 0
+						"company": company
 					}
 				};
 			}
@@ -61,6 +70,26 @@ frappe.query_reports["Tally Ledger"] = {
 
 				return frappe.db.get_link_options(party_type, txt);
 			}
+		},
+		{
+			"fieldname": "view",
+			"label": __("View"),
+			"fieldtype": "Select",
+			"options": ["Transactions", "Group Summary"],
+			"default": "Transactions"
+		},
+		{
+			"fieldname": "narration",
+			"label": __("Narration / Reference"),
+			"fieldtype": "Data",
+			"description": __("Entries whose narration contains every word, such as a cheque number")
+		},
+		{
+			"fieldname": "compact_transfer",
+			"label": __("Compact Transfer"),
+			"fieldtype": "Check",
+			"description": __("Send rows as compressed columns, for very large ledgers"),
+			"default": 0
 		}
 	],
 
@@ -68,6 +97,14 @@ frappe.query_reports["Tally Ledger"] = {
 		// Use default formatter first
 		value = default_formatter(value, row, column, data);
 
+		// Group Summary: expand the account's transactions on click
+		if (column.fieldname === "account" && data && data._is_account_summary) {
+			return `<a style="color: #2490ef; cursor: pointer;"
+				onclick="frappe.query_reports['Tally Ledger'].show_account_transactions(decodeURIComponent('${encodeURIComponent(data.account)}'));">
+				${frappe.utils.escape_html(data.account)}
+			</a>`;
+		}
+
 		// Make voucher number clickable
 		if (column.fieldname === "vch_no" && data && data.voucher_type && data.voucher_no) {
 			// Create a clickable link to the voucher
@@ -100,7 +137,56 @@ frappe.query_reports["Tally Ledger"] = {
 		return value;
 	},
 
+	"show_account_transactions": function(account) {
+		frappe.call({
+			method: "tally_customizations.tally_customizations.report.tally_ledger.tally_ledger.get_account_transactions",
+			args: {
+				filters: frappe.query_report.get_filter_values(),
+				account: account
+			},
+			freeze: true,
+			callback: function(r) {
+				let rows = (r.message || []).map(function(row) {
+					let style = (row._is_opening || row._is_closing || row._is_total) ? "font-weight: bold;" : "";
+					return `<tr style="${style}">
+						<td>${row.posting_date || ""}</td>
+						<td>${frappe.utils.escape_html(row.particulars || "")}</td>
+						<td>${row.vch_type || ""}</td>
+						<td>${row.vch_no || ""}</td>
+						<td class="text-right">${row.debit ? format_currency(row.debit) : ""}</td>
+						<td class="text-right">${row.credit ? format_currency(row.credit) : ""}</td>
+					</tr>`;
+				}).join("");
+
+				let dialog = new frappe.ui.Dialog({
+					title: account,
+					size: "extra-large",
+					fields: [{ fieldname: "transactions", fieldtype: "HTML" }]
+				});
+				dialog.fields_dict.transactions.$wrapper.html(`
+					<table class="table table-bordered table-condensed">
+						<thead>
+							<tr>
+								<th>${__("Date")}</th>
+								<th>${__("Particulars")}</th>
+								<th>${__("Vch Type")}</th>
+								<th>${__("Vch No")}</th>
+								<th class="text-right">${__("Debit")}</th>
+								<th class="text-right">${__("Credit")}</th>
+							</tr>
+						</thead>
+						<tbody>${rows}</tbody>
+					</table>
+				`);
+				dialog.show();
+			}
+		});
+	},
+
 	"onload": function(report) {
+		// Compact Transfer runs go to the compact endpoint, their rows are decoded before rendering
+		tally_customizations.compact_rows.setup(report);
+
 		// Add custom Print button with Tally styling
 		report.page.add_inner_button(__("Tally Print"), function() {
 			let filters = frappe.query_report.get_filter_values();
@@ -111,70 +197,24 @@ frappe.query_reports["Tally Ledger"] = {
 				return;
 			}
 
-			// Get account name for display
-			let account_name = filters.account;
-
-			// Handle party filter (which is now an array from MultiSelectList)
-			if (filters.party && Array.isArray(filters.party) && filters.party.length > 0) {
-				account_name = filters.party.join(", ");
-			} else if (filters.party && typeof filters.party === 'string') {
-				account_name = filters.party;
-			}
-
-			if (!account_name) {
-				account_name = "All Accounts";
-			}
+			// The server streams the HTML, so the print window fills in while it renders
+			let url = "/api/method/tally_customizations.tally_customizations.report.tally_ledger.tally_ledger.stream_print_html?"
+				+ $.param({ filters: JSON.stringify(filters) });
+			let print_window = window.open(url, "_blank");
 
-			let ledger_type = "Ledger Account";
+			// Print once the whole document has arrived
+			print_window.addEventListener("load", function() {
+				print_window.print();
+			});
+		});
 
-			if (filters.party_type === "Customer") {
-				ledger_type = "Customer Ledger";
-			} else if (filters.party_type === "Supplier") {
-				ledger_type = "Supplier Ledger";
-			} else if (filters.account) {
-				ledger_type = "Account Ledger";
-			}
+		// Server-side paginated PDF with b/f and c/f totals, for periods too large to print in the browser
+		report.page.add_inner_button(__("Download PDF"), function() {
+			let filters = frappe.query_report.get_filter_values();
+			let url = "/api/method/tally_customizations.tally_customizations.report.tally_ledger.tally_ledger.download_pdf?"
+				+ $.param({ filters: JSON.stringify(filters) });
 
-			// Get company details
-			frappe.call({
-				method: "frappe.client.get",
-				args: {
-					doctype: "Company",
-					name: filters.company
-				},
-				callback: function(r) {
-					if (r.message) {
-						let company = r.message.company_name || r.message.name;
-						let company_address = r.message.address || "";
-
-						// Call server-side method to render template
-						frappe.call({
-							method: "tally_customizations.tally_customizations.report.tally_ledger.tally_ledger.get_print_html",
-							args: {
-								filters: filters,
-								data: data,
-								company: company,
-								company_address: company_address,
-								account_name: account_name,
-								ledger_type: ledger_type
-							},
-							callback: function(response) {
-								if (response.message) {
-									// Build print window
-									let print_window = window.open("", "_blank");
-									print_window.document.write(response.message);
-									print_window.document.close();
-
-									// Auto print after a short delay
-									setTimeout(function() {
-										print_window.print();
-									}, 500);
-								}
-							}
-						});
-					}
-				}
-			});
+			window.open(url);
 		});
 	}
 };
\ No newline at end of file
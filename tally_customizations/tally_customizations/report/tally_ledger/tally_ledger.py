@@ -1,10 +1,42 @@
 # Copyright (c) 2024, Your Company and contributors
 # For license information, please see license.txt
 
+import os
+from itertools import groupby
+
 import frappe
 from frappe import _, _dict
-from frappe.utils import flt, getdate, fmt_money, get_datetime_str
-import os
+from frappe.utils import cint, flt, fmt_money, get_datetime_str, getdate
+
+from tally_customizations.admission import report_slot
+from tally_customizations.gl_cache import get_cached_balance
+from tally_customizations.in_filter import in_condition
+from tally_customizations.ledger_print import (
+	ROWS_PER_PAGE,
+	check_report_permission,
+	paginate_rows,
+	render_pdf,
+	set_pdf_response,
+	stream_html,
+)
+from tally_customizations.ledger_query import (
+	add_running_balances,
+	get_account_range,
+	get_balance_columns,
+	get_period_totals,
+	supports_window_functions,
+)
+from tally_customizations.ledger_totals import LedgerTotals, sum_amounts
+from tally_customizations.lookup_cache import get_company_currency
+from tally_customizations.narration_search import search_condition
+from tally_customizations.parallel_query import (
+	fetch_for_companies,
+	fetch_in_partitions,
+	get_companies,
+	get_month_partitions,
+	get_partition_months,
+	gl_entry_order,
+)
 
 
 def execute(filters=None):
@@ -14,8 +46,10 @@ def execute(filters=None):
 
 	validate_filters(filters)
 	columns = get_columns(filters)
-	data = get_data(filters)
-	
+
+	with report_slot("Tally Ledger", filters):
+		data = get_data(filters)
+
 	return columns, data
 
 
@@ -31,12 +65,51 @@ def validate_filters(filters):
 		frappe.throw(_("Please select To Date"))
 
 
+def is_group_summary(filters):
+	"""Check if the one-line-per-ledger Group Summary is requested
+
+	Only applies to the all accounts view, a selected account or party always
+	shows its transactions.
+	"""
+	return filters.get("view") == "Group Summary" and not filters.get("account") \
+		and not (filters.get("party_type") and filters.get("party")) \
+		and not filters.get("narration")
+
+
+def is_group_account(filters):
+	"""Check if the selected account is a group account"""
+	return bool(get_account_range(filters.get("account")))
+
+
+def get_party_condition(filters, values, alias=""):
+	"""Condition for the party filter (a single party or a MultiSelectList)
+
+	The party values are added to values. Returns (condition, parties), the
+	condition is empty without a party filter.
+	"""
+	party = filters.get("party")
+	if not (filters.get("party_type") and party):
+		return "", []
+
+	parties = [p for p in (party if isinstance(party, (list, tuple)) else [party]) if p]
+	if not parties:
+		return "", []
+
+	values["party_type"] = filters.get("party_type")
+	party_condition = in_condition(f"{alias}party", parties, "parties", values)
+	return f"{alias}party_type = %(party_type)s AND {party_condition}", parties
+
+
 def get_columns(filters):
 	"""Define columns in Tally style"""
 	columns = []
 
-	# Add account column if showing all accounts
-	if not filters.get("account") and not (filters.get("party_type") and filters.get("party")):
+	if is_group_summary(filters):
+		return get_group_summary_columns()
+
+	# Add account column if showing all accounts, the ledgers of a group account or search matches
+	if is_group_account(filters) or filters.get("narration") \
+		or (not filters.get("account") and not (filters.get("party_type") and filters.get("party"))):
 		columns.append({
 			"fieldname": "account",
 			"label": _("Account"),
@@ -84,6 +157,14 @@ def get_columns(filters):
 		}
 	])
 
+	if filters.get("narration"):
+		columns.append({
+			"fieldname": "remarks",
+			"label": _("Narration"),
+			"fieldtype": "Data",
+			"width": 300
+		})
+
 	return columns
 
 
@@ -92,7 +173,16 @@ def get_data(filters):
 	data = []
 
 	# Check if specific account or party is selected
-	if filters.get("account") or (filters.get("party_type") and filters.get("party")):
+	if filters.get("narration"):
+		# Only the matching entries, an opening or closing balance of a subset would mislead
+		data = get_all_accounts_data(filters)
+	elif is_group_summary(filters):
+		# One row per account, transactions are fetched on drill-down
+		data = get_group_summary_data(filters)
+	elif is_group_account(filters):
+		# Every ledger under the group, each with its own opening and subtotal
+		data = get_group_account_data(filters)
+	elif filters.get("account") or (filters.get("party_type") and filters.get("party")):
 		# Single account/party view with opening/closing balance
 		data = get_single_account_data(filters)
 	else:
@@ -131,10 +221,6 @@ def get_single_account_data(filters):
 	# Get GL entries for the period
 	gl_entries = get_gl_entries(filters)
 
-	# Track running totals
-	total_debit = opening_balance if opening_balance > 0 else 0.0
-	total_credit = abs(opening_balance) if opening_balance < 0 else 0.0
-
 	# Process each GL entry
 	for gle in gl_entries:
 		# Format particulars with To/By prefix (Tally style)
@@ -163,17 +249,18 @@ def get_single_account_data(filters):
 			"debit": debit_amt,
 			"credit": credit_amt,
 			"voucher_type": gle.get("voucher_type", ""),  # Original voucher type for linking
-			"voucher_no": gle.get("voucher_no") or ""  # Voucher number for linking
+			"voucher_no": gle.get("voucher_no") or "",  # Voucher number for linking
+			"balance": sum_amounts(opening_balance, gle.running_balance)  # Running balance after this entry
 		})
 
 		data.append(row)
 
-		# Update totals
-		total_debit += debit_amt
-		total_credit += credit_amt
+	# Period totals come with the entries, no accumulation needed
+	totals = LedgerTotals(opening_balance)
+	totals.add(*get_period_totals(gl_entries))
 
 	# Calculate closing balance
-	closing_balance = total_debit - total_credit
+	closing_balance = totals.closing_balance
 
 	# Add closing balance row
 	closing_row = _dict({
@@ -187,20 +274,14 @@ def get_single_account_data(filters):
 	})
 	data.append(closing_row)
 
-	# Update totals to balance
-	if closing_balance < 0:
-		total_debit += abs(closing_balance)
-	else:
-		total_credit += closing_balance
-
-	# Add final total row
+	# Add final total row, the closing balance on the opposite side balances it
 	total_row = _dict({
 		"posting_date": "",
 		"particulars": "",
 		"vch_type": "",
 		"vch_no": "",
-		"debit": total_debit,
-		"credit": total_credit,
+		"debit": totals.total_debit,
+		"credit": totals.total_credit,
 		"_is_total": True
 	})
 	data.append(total_row)
@@ -208,6 +289,158 @@ def get_single_account_data(filters):
 	return data
 
 
+def get_group_account_data(filters):
+	"""Ledger of a group account: each ledger under it with its opening balance,
+	entries and subtotal, then the group's closing balance and total
+
+	The ledgers come from the group's lft/rgt range joined in the same query
+	that reads the entries. Entries are ordered by account, so every ledger's
+	subtotal and the group total are built in one pass.
+	"""
+	data = []
+	lft, rgt = get_account_range(filters.get("account"))
+
+	values = {
+		"companies": tuple(get_companies(filters)),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date"),
+		"lft": lft,
+		"rgt": rgt
+	}
+
+	party_condition = get_party_condition(filters, values, "gle.")[0]
+	if party_condition:
+		party_condition = "AND " + party_condition
+
+	# Opening balance of every ledger under the group
+	openings = dict(frappe.db.sql(f"""
+		SELECT gle.account, SUM(gle.debit) - SUM(gle.credit)
+		FROM `tabGL Entry` gle
+		INNER JOIN `tabAccount` acc ON acc.name = gle.account
+		WHERE
+			acc.lft >= %(lft)s
+			AND acc.rgt <= %(rgt)s
+			AND gle.company IN %(companies)s
+			AND gle.posting_date < %(from_date)s
+			AND gle.is_cancelled = 0
+			{party_condition}
+		GROUP BY gle.account
+	""", values))
+
+	gl_entries = frappe.db.sql(f"""
+		SELECT
+			gle.posting_date,
+			gle.account,
+			gle.party_type,
+			gle.party,
+			gle.voucher_type,
+			gle.voucher_no,
+			gle.debit,
+			gle.credit,
+			gle.against,
+			gle.remarks,
+			gle.creation,
+			gle.name
+		FROM `tabGL Entry` gle
+		INNER JOIN `tabAccount` acc ON acc.name = gle.account
+		WHERE
+			acc.lft >= %(lft)s
+			AND acc.rgt <= %(rgt)s
+			AND gle.company IN %(companies)s
+			AND gle.posting_date >= %(from_date)s
+			AND gle.posting_date <= %(to_date)s
+			AND gle.is_cancelled = 0
+			{party_condition}
+		ORDER BY gle.account, gle.posting_date, gle.creation, gle.name
+	""", values, as_dict=1)
+
+	entries_by_account = {account: list(entries) for account, entries in groupby(gl_entries, key=lambda gle: gle.account)}
+	from_date = frappe.utils.formatdate(filters.get("from_date"), "d-M-yyyy")
+
+	# Group opening, period and closing totals, kept exactly in cents
+	group_totals = LedgerTotals(sum_amounts(*openings.values()))
+
+	for account in sorted(set(openings) | set(entries_by_account)):
+		totals = LedgerTotals(flt(openings.get(account)))
+		opening_balance = totals.opening_balance
+		entries = entries_by_account.get(account, [])
+
+		if not opening_balance and not entries:
+			continue
+
+		if opening_balance:
+			data.append(_dict({
+				"account": account,
+				"posting_date": from_date,
+				"particulars": "By Opening Balance",
+				"vch_type": "",
+				"vch_no": "",
+				"debit": opening_balance if opening_balance > 0 else 0,
+				"credit": abs(opening_balance) if opening_balance < 0 else 0,
+				"_is_opening": True
+			}))
+
+		# Running balance of the ledger after each entry, the batch added at once
+		balances = totals.add_running([gle.debit for gle in entries], [gle.credit for gle in entries])
+
+		for gle, balance in zip(entries, balances, strict=True):
+			data.append(_dict({
+				"account": account,
+				"posting_date": frappe.utils.formatdate(gle.posting_date, "d-M-yyyy") if gle.posting_date else "",
+				"particulars": format_particulars(gle),
+				"vch_type": map_voucher_type(gle.get("voucher_type", "")),
+				"vch_no": gle.get("voucher_no") or "",
+				"debit": flt(gle.debit),
+				"credit": flt(gle.credit),
+				"voucher_type": gle.get("voucher_type", ""),  # Original voucher type for linking
+				"voucher_no": gle.get("voucher_no") or "",  # Voucher number for linking
+				"balance": balance
+			}))
+
+		# Ledger subtotal, with the ledger's closing balance
+		data.append(_dict({
+			"account": account,
+			"posting_date": "",
+			"particulars": "Sub Total",
+			"vch_type": "",
+			"vch_no": "",
+			"debit": totals.period_debit,
+			"credit": totals.period_credit,
+			"balance": totals.closing_balance,
+			"_is_subtotal": True
+		}))
+
+		group_totals.add(totals.period_debit, totals.period_credit)
+
+	if not data:
+		return data
+
+	# Group closing balance and the balancing total, as for a single account
+	closing_balance = group_totals.closing_balance
+	data.append(_dict({
+		"account": "",
+		"posting_date": "",
+		"particulars": "To Closing Balance",
+		"vch_type": "",
+		"vch_no": "",
+		"debit": closing_balance if closing_balance > 0 else 0,
+		"credit": abs(closing_balance) if closing_balance < 0 else 0,
+		"_is_closing": True
+	}))
+	data.append(_dict({
+		"account": "",
+		"posting_date": "",
+		"particulars": "",
+		"vch_type": "",
+		"vch_no": "",
+		"debit": group_totals.total_debit,
+		"credit": group_totals.total_credit,
+		"_is_total": True
+	}))
+
+	return data
+
+
 def get_all_accounts_data(filters):
 	"""Get data for all accounts - just transactions and total"""
 	data = []
@@ -215,10 +448,6 @@ def get_all_accounts_data(filters):
 	# Get GL entries for all accounts
 	gl_entries = get_gl_entries(filters)
 
-	# Track totals
-	total_debit = 0.0
-	total_credit = 0.0
-
 	# Process each GL entry
 	for gle in gl_entries:
 		# Format particulars with To/By prefix (Tally style)
@@ -248,17 +477,15 @@ def get_all_accounts_data(filters):
 			"debit": debit_amt,
 			"credit": credit_amt,
 			"voucher_type": gle.get("voucher_type", ""),  # Original voucher type for linking
-			"voucher_no": gle.get("voucher_no") or ""  # Voucher number for linking
+			"voucher_no": gle.get("voucher_no") or "",  # Voucher number for linking
+			"remarks": gle.get("remarks") or ""
 		})
 
 		data.append(row)
 
-		# Update totals
-		total_debit += debit_amt
-		total_credit += credit_amt
-
 	# Add total row - just totals, no closing balance for all accounts view
 	if data:
+		total_debit, total_credit = get_period_totals(gl_entries)
 		total_row = _dict({
 			"account": "",
 			"posting_date": "",
@@ -274,41 +501,161 @@ def get_all_accounts_data(filters):
 	return data
 
 
+def get_group_summary_columns():
+	"""Columns for the Group Summary view"""
+	return [
+		{
+			"fieldname": "account",
+			"label": _("Particulars"),
+			"fieldtype": "Link",
+			"options": "Account",
+			"width": 300
+		},
+		{
+			"fieldname": "opening",
+			"label": _("Opening Balance"),
+			"fieldtype": "Currency",
+			"width": 150
+		},
+		{
+			"fieldname": "debit",
+			"label": _("Debit"),
+			"fieldtype": "Currency",
+			"width": 150
+		},
+		{
+			"fieldname": "credit",
+			"label": _("Credit"),
+			"fieldtype": "Currency",
+			"width": 150
+		},
+		{
+			"fieldname": "closing",
+			"label": _("Closing Balance"),
+			"fieldtype": "Currency",
+			"width": 150
+		}
+	]
+
+
+def get_group_summary_data(filters):
+	"""Get one row per account with opening, period debit/credit and closing"""
+	data = []
+
+	# Opening and period figures for every account in one grouped scan
+	accounts = frappe.db.sql("""
+		SELECT
+			account,
+			SUM(CASE WHEN posting_date < %(from_date)s THEN debit - credit ELSE 0 END) as opening,
+			SUM(CASE WHEN posting_date >= %(from_date)s THEN debit ELSE 0 END) as debit,
+			SUM(CASE WHEN posting_date >= %(from_date)s THEN credit ELSE 0 END) as credit
+		FROM `tabGL Entry`
+		WHERE
+			company IN %(companies)s
+			AND posting_date <= %(to_date)s
+			AND is_cancelled = 0
+		GROUP BY account
+		HAVING opening != 0 OR debit != 0 OR credit != 0
+		ORDER BY account
+	""", {
+		"companies": tuple(get_companies(filters)),
+		"from_date": filters.get("from_date"),
+		"to_date": filters.get("to_date")
+	}, as_dict=1)
+
+	for acc in accounts:
+		totals = LedgerTotals(acc.opening)
+		totals.add(acc.debit, acc.credit)
+
+		data.append(_dict({
+			"account": acc.account,
+			"particulars": acc.account,  # Shown in the Particulars column when printed
+			"opening": totals.opening_balance,
+			"debit": totals.period_debit,
+			"credit": totals.period_credit,
+			"closing": totals.closing_balance,
+			"_is_account_summary": True
+		}))
+
+	if data:
+		# Totals of every account, kept exactly in cents
+		group_totals = LedgerTotals(sum_amounts(*(acc.opening for acc in accounts)))
+		group_totals.add_many([acc.debit for acc in accounts], [acc.credit for acc in accounts])
+
+		data.append(_dict({
+			"account": "",
+			"particulars": "Total",
+			"opening": group_totals.opening_balance,
+			"debit": group_totals.period_debit,
+			"credit": group_totals.period_credit,
+			"closing": group_totals.closing_balance,
+			"_is_total": True
+		}))
+
+	return data
+
+
+@frappe.whitelist()
+def get_account_transactions(filters, account):
+	"""Transactions of one account, fetched when it is expanded in the Group Summary"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = _dict(filters)
+
+	check_report_permission("Tally Ledger")
+	validate_filters(filters)
+
+	filters.account = account
+	filters.view = "Transactions"
+
+	return get_single_account_data(filters)
+
+
 def get_opening_balance(filters):
 	"""Calculate opening balance before from_date"""
 	conditions = []
 	values = {
-		"company": filters.get("company"),
+		"companies": tuple(get_companies(filters)),
 		"from_date": filters.get("from_date")
 	}
 
-	# Add account condition if specified
-	if filters.get("account"):
+	# Add account condition if specified, a group account covers its ledgers
+	accounts = None
+	account_range = get_account_range(filters.get("account"))
+	if account_range:
+		conditions.append("account IN (SELECT name FROM `tabAccount` WHERE lft >= %(lft)s AND rgt <= %(rgt)s)")
+		values["lft"], values["rgt"] = account_range
+		accounts = frappe.get_all("Account", filters={
+			"lft": [">=", account_range[0]],
+			"rgt": ["<=", account_range[1]],
+			"is_group": 0
+		}, pluck="name")
+	elif filters.get("account"):
 		conditions.append("account = %(account)s")
 		values["account"] = filters.get("account")
+		accounts = [filters.get("account")]
 
-	# Add party filters
-	if filters.get("party_type") and filters.get("party"):
-		party = filters.get("party")
-		if isinstance(party, (list, tuple)) and len(party) > 0:
-			# For multiple parties, calculate combined opening balance
-			party_placeholders = ', '.join([f"%(party_{idx})s" for idx in range(len(party))])
-			conditions.append(f"party_type = %(party_type)s AND party IN ({party_placeholders})")
-			values["party_type"] = filters.get("party_type")
-			for idx, p in enumerate(party):
-				values[f"party_{idx}"] = p
-		else:
-			# Single party
-			if isinstance(party, list):
-				party = party[0] if party else None
-			if party:
-				conditions.append("party_type = %(party_type)s AND party = %(party)s")
-				values["party_type"] = filters.get("party_type")
-				values["party"] = party
+	# Add party filters, for multiple parties the combined opening balance
+	party_condition, parties = get_party_condition(filters, values)
+	if party_condition:
+		conditions.append(party_condition)
 
 	if not conditions:
 		return 0.0
 
+	# Closed periods come from the columnar cache, the database adds the rest
+	cached_balance, cached_upto = get_cached_balance(
+		filters,
+		accounts=accounts,
+		party_type=values.get("party_type"),
+		parties=parties
+	)
+	if cached_upto:
+		conditions.append("posting_date > %(cached_upto)s")
+		values["cached_upto"] = cached_upto
+
 	where_clause = " AND ".join(conditions)
 
 	opening = frappe.db.sql(f"""
@@ -317,46 +664,62 @@ def get_opening_balance(filters):
 		FROM `tabGL Entry`
 		WHERE
 			{where_clause}
-			AND company = %(company)s
+			AND company IN %(companies)s
 			AND posting_date < %(from_date)s
 			AND is_cancelled = 0
 	""", values, as_dict=1)
 
-	return flt(opening[0].balance) if opening and opening[0].balance else 0.0
+	return sum_amounts(cached_balance, opening[0].balance if opening else 0)
 
 
 def get_gl_entries(filters):
-	"""Fetch GL entries for the selected period"""
+	"""Fetch GL entries for the selected period of every selected company"""
+	if len(get_companies(filters)) > 1:
+		# One concurrent query per company, merged in ledger order; the running
+		# balance runs across the merged ledger so it is filled afterwards
+		gl_entries = fetch_for_companies(filters, query_gl_entries, gl_entry_order, False)
+		return add_running_balances(gl_entries)
+
+	if len(get_month_partitions(filters.get("from_date"), filters.get("to_date"), get_partition_months())) > 1:
+		# Long periods: one concurrent query per month partition, concatenated in order
+		gl_entries = fetch_in_partitions(filters, query_gl_entries, False)
+		return add_running_balances(gl_entries)
+
+	return query_gl_entries(filters)
+
+
+def query_gl_entries(filters, with_balances=True):
+	"""Fetch GL entries of one company, ordered by posting_date, account, creation"""
 	conditions = []
 	values = dict(filters)
 
-	# Add account condition if specified
-	if filters.get("account"):
+	# Add account condition if specified, a group account covers its ledgers
+	account_range = get_account_range(filters.get("account"))
+	if account_range:
+		conditions.append("account IN (SELECT name FROM `tabAccount` WHERE lft >= %(lft)s AND rgt <= %(rgt)s)")
+		values["lft"], values["rgt"] = account_range
+	elif filters.get("account"):
 		conditions.append("account = %(account)s")
 
 	# Add party filters
-	if filters.get("party_type") and filters.get("party"):
-		# Handle party as list (MultiSelectList) or single value
-		party = filters.get("party")
-		if isinstance(party, (list, tuple)) and len(party) > 0:
-			# Use IN clause for multiple parties
-			party_placeholders = ', '.join([f"%(party_{idx})s" for idx in range(len(party))])
-			conditions.append(f"party_type = %(party_type)s AND party IN ({party_placeholders})")
-			# Add party values to SQL parameters
-			for idx, p in enumerate(party):
-				values[f"party_{idx}"] = p
-		else:
-			# Single party or string
-			if isinstance(party, list):
-				party = party[0] if party else None
-			if party:
-				conditions.append("party_type = %(party_type)s AND party = %(party)s")
-				values["party"] = party
+	party_condition = get_party_condition(filters, values)[0]
+	if party_condition:
+		conditions.append(party_condition)
+
+	# Narration / reference search
+	narration_condition = search_condition(filters.get("narration"), values)
+	if narration_condition:
+		conditions.append(narration_condition)
 
 	where_clause = ""
 	if conditions:
 		where_clause = " AND " + " AND ".join(conditions)
 
+	# Running balance and period totals are computed by the database where supported
+	balance_columns = ""
+	if with_balances and supports_window_functions():
+		balance_columns = "," + get_balance_columns("posting_date, account, creation, name")
+
 	gl_entries = frappe.db.sql(f"""
 		SELECT
 			posting_date,
@@ -368,7 +731,9 @@ def get_gl_entries(filters):
 			debit,
 			credit,
 			against,
-			remarks
+			remarks,
+			creation,
+			name{balance_columns}
 		FROM `tabGL Entry`
 		WHERE
 			company = %(company)s
@@ -376,9 +741,13 @@ def get_gl_entries(filters):
 			AND posting_date <= %(to_date)s
 			AND is_cancelled = 0
 			{where_clause}
-		ORDER BY posting_date, account, creation
+		ORDER BY posting_date, account, creation, name
 	""", values, as_dict=1)
 
+	# Older database servers: fill the same fields in Python
+	if with_balances and not balance_columns:
+		add_running_balances(gl_entries)
+
 	return gl_entries
 
 
@@ -424,37 +793,54 @@ def map_voucher_type(voucher_type):
 	return mapping.get(voucher_type, voucher_type)
 
 
-@frappe.whitelist()
-def get_print_html(filters, data, company, company_address, account_name, ledger_type):
-	"""Generate HTML for printing the ledger"""
-	import json
+def get_ledger_title(filters):
+	"""Account name and ledger type shown in the print header"""
+	account_name = filters.get("account")
+
+	# Party filter is a list from MultiSelectList
+	party = filters.get("party")
+	if party and isinstance(party, (list, tuple)):
+		account_name = ", ".join(party)
+	elif party:
+		account_name = party
+
+	if not account_name:
+		account_name = "All Accounts"
+
+	if filters.get("party_type") == "Customer":
+		ledger_type = "Customer Ledger"
+	elif filters.get("party_type") == "Supplier":
+		ledger_type = "Supplier Ledger"
+	elif is_group_account(filters):
+		ledger_type = "Group Ledger"
+	elif filters.get("account"):
+		ledger_type = "Account Ledger"
+	else:
+		ledger_type = "Ledger Account"
 
-	# Parse JSON strings if needed
-	if isinstance(filters, str):
-		filters = json.loads(filters)
-	if isinstance(data, str):
-		data = json.loads(data)
+	return account_name, ledger_type
 
-	# Get the template path
+
+def get_print_template():
+	"""Load the Tally Ledger print template"""
 	template_path = os.path.join(
 		os.path.dirname(__file__),
 		"tally_ledger_print.html"
 	)
 
-	# Read template content
-	with open(template_path, "r") as f:
+	with open(template_path) as f:
 		template_content = f.read()
 
-	# Render template with Jinja
 	from jinja2 import Template
-	template = Template(template_content)
+	return Template(template_content)
+
 
+def get_print_context(filters, data, company, company_address, account_name, ledger_type):
+	"""Prepare the template context shared by the browser print and the PDF download"""
 	# Get company currency
-	company_currency = frappe.db.get_value("Company", filters.get("company"), "default_currency") or \
-		frappe.defaults.get_global_default("currency") or "USD"
+	company_currency = get_company_currency(filters.get("company")) or "USD"
 
-	# Prepare context
-	context = {
+	return {
 		"title": f"Tally Ledger - {account_name}",
 		"company": company,
 		"company_address": company_address,
@@ -467,6 +853,72 @@ def get_print_html(filters, data, company, company_address, account_name, ledger
 		"frappe": frappe
 	}
 
+
+@frappe.whitelist()
+def get_print_html(filters, data, company, company_address, account_name, ledger_type):
+	"""Generate HTML for printing the ledger"""
+	import json
+
+	# Parse JSON strings if needed
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	if isinstance(data, str):
+		data = json.loads(data)
+
+	template = get_print_template()
+	context = get_print_context(filters, data, company, company_address, account_name, ledger_type)
+
+	# Everything on one page - the browser paginates
+	context["pages"] = paginate_rows(data)
+
 	# Render and return HTML
 	html = template.render(context)
-	return html
\ No newline at end of file
+	return html
+
+
+def get_report_print_context(filters):
+	"""Run the report server-side and prepare the print context for it"""
+	check_report_permission("Tally Ledger")
+	_, data = execute(filters)
+
+	company_doc = frappe.get_cached_doc("Company", filters.get("company"))
+	account_name, ledger_type = get_ledger_title(filters)
+	return get_print_context(
+		filters,
+		data,
+		company_doc.company_name or company_doc.name,
+		company_doc.get("address") or "",
+		account_name,
+		ledger_type
+	)
+
+
+@frappe.whitelist()
+def stream_print_html(filters):
+	"""Stream the print HTML to the browser while it renders"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = _dict(filters)
+
+	context = get_report_print_context(filters)
+	context["pages"] = paginate_rows(context["data"])
+
+	return stream_html(get_print_template(), context)
+
+
+@frappe.whitelist()
+def download_pdf(filters, rows_per_page=None):
+	"""Render the Tally Ledger server-side as a paginated PDF download"""
+	import json
+
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	filters = _dict(filters)
+
+	context = get_report_print_context(filters)
+	pages = paginate_rows(context["data"], cint(rows_per_page) or ROWS_PER_PAGE)
+	pdf = render_pdf(get_print_template(), context, pages)
+
+	set_pdf_response(f"Tally Ledger {filters.get('from_date')} to {filters.get('to_date')}", pdf)
@@ -0,0 +1,144 @@
+"""
+Static analysis of the app's Jinja templates for database access.
+
+Every template is parsed with the Jinja AST and each call to a frappe
+database helper is reported with its `{% for %}` nesting depth. Calls at
+depth > 0 run once per loop iteration (an N+1 in production), so known
+in-loop calls are recorded in a baseline and new ones can fail the check.
+"""
+import json
+import os
+from collections import Counter
+
+from jinja2 import Environment, nodes
+from jinja2.exceptions import TemplateSyntaxError
+
+APP_PATH = os.path.dirname(__file__)
+BASELINE_PATH = os.path.join(APP_PATH, "template_query_baseline.json")
+
+# Calls that hit the database, in addition to anything under frappe.db.*
+DB_CALLS = {
+	"frappe.get_doc",
+	"frappe.get_cached_doc",
+	"frappe.get_all",
+	"frappe.get_list",
+	"frappe.get_value",
+	"frappe.get_cached_value",
+	"frappe.get_single",
+}
+
+# frappe.db helpers that do not query
+NON_DB_CALLS = {"frappe.db.escape"}
+
+
+def is_db_call(name):
+	"""Check if a dotted call name accesses the database"""
+	if name in NON_DB_CALLS:
+		return False
+	return name in DB_CALLS or name.startswith("frappe.db.")
+
+
+def get_dotted_name(node):
+	"""Resolve `frappe.db.get_value` style attribute chains, None for anything else"""
+	if isinstance(node, nodes.Name):
+		return node.name
+	if isinstance(node, nodes.Getattr):
+		parent = get_dotted_name(node.node)
+		return f"{parent}.{node.attr}" if parent else None
+	return None
+
+
+def find_db_calls(source):
+	"""Return (lineno, call_name, loop_depth) for every DB call in a template source"""
+	found = []
+	tree = Environment().parse(source)
+	_walk(tree, 0, found)
+	return found
+
+
+def _walk(node, depth, found):
+	if isinstance(node, nodes.For):
+		# The iterable is evaluated once; the body and loop filter once per item
+		_walk(node.iter, depth, found)
+		if node.test:
+			_walk(node.test, depth + 1, found)
+		for child in node.body:
+			_walk(child, depth + 1, found)
+		for child in node.else_:
+			_walk(child, depth, found)
+		return
+
+	if isinstance(node, nodes.Call):
+		name = get_dotted_name(node.node)
+		if name and is_db_call(name):
+			found.append((node.lineno, name, depth))
+
+	for child in node.iter_child_nodes():
+		_walk(child, depth, found)
+
+
+def get_templates():
+	"""All HTML templates in the app, as paths relative to the app package"""
+	templates = []
+	for root, dirs, files in os.walk(APP_PATH):
+		dirs[:] = sorted(d for d in dirs if d not in ("node_modules", "__pycache__"))
+		for filename in sorted(files):
+			if filename.endswith(".html"):
+				templates.append(os.path.relpath(os.path.join(root, filename), APP_PATH))
+	return templates
+
+
+def analyze_templates(templates=None):
+	"""Analyze templates and return ({path: [(lineno, call, depth)]}, {path: error})"""
+	results = {}
+	errors = {}
+
+	for path in templates or get_templates():
+		with open(os.path.join(APP_PATH, path)) as f:
+			source = f.read()
+
+		try:
+			calls = find_db_calls(source)
+		except TemplateSyntaxError as e:
+			errors[path] = f"line {e.lineno}: {e.message}"
+			continue
+
+		if calls:
+			results[path] = calls
+
+	return results, errors
+
+
+def get_in_loop_counts(results):
+	"""Count in-loop calls per template and call name, the unit tracked by the baseline"""
+	counts = {}
+	for path, calls in results.items():
+		in_loop = Counter(name for lineno, name, depth in calls if depth > 0)
+		if in_loop:
+			counts[path] = dict(sorted(in_loop.items()))
+	return counts
+
+
+def load_baseline():
+	"""Load the recorded in-loop calls, empty if no baseline exists"""
+	if not os.path.exists(BASELINE_PATH):
+		return {}
+	with open(BASELINE_PATH) as f:
+		return json.load(f)
+
+
+def save_baseline(counts):
+	"""Record the current in-loop calls as accepted"""
+	with open(BASELINE_PATH, "w") as f:
+		json.dump(counts, f, indent=1, sort_keys=True)
+
+
+def get_new_in_loop_calls(counts, baseline):
+	"""Return [(path, call, count, allowed)] for in-loop calls above the baseline"""
+	new_calls = []
+	for path, calls in sorted(counts.items()):
+		for name, count in calls.items():
+			allowed = baseline.get(path, {}).get(name, 0)
+			if count > allowed:
+				new_calls.append((path, name, count, allowed))
+	return new_calls
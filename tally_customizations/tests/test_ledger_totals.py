@@ -0,0 +1,115 @@
+import random
+import unittest
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from tally_customizations import ledger_totals
+from tally_customizations.ledger_totals import LedgerTotals, sum_minor_units, to_minor_units
+
+CENT = Decimal("0.01")
+
+# Amounts whose float * 100 lands just off a half cent, and exact half cents
+BOUNDARY_AMOUNTS = [
+	0.005, 0.015, 0.125, 1.005, 2.675, 10.075, 1234.565, 99999.995,
+	-0.005, -2.675, -1.005, -1234.565
+]
+
+
+def to_cents(amount):
+	"""Reference: the amount as written, rounded to cents with halves to even"""
+	return Decimal(repr(amount)).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+def get_reference(opening, debits, credits):
+	"""Decimal opening, period, closing and balancing totals of a ledger"""
+	opening = to_cents(opening)
+	debit = sum((to_cents(amount) for amount in debits), Decimal(0))
+	credit = sum((to_cents(amount) for amount in credits), Decimal(0))
+	closing = opening + debit - credit
+
+	return {
+		"opening_balance": opening,
+		"opening_debit": max(opening, 0),
+		"opening_credit": max(-opening, 0),
+		"period_debit": debit,
+		"period_credit": credit,
+		"closing_balance": closing,
+		"total_debit": max(opening, 0) + debit + max(-closing, 0),
+		"total_credit": max(-opening, 0) + credit + max(closing, 0)
+	}
+
+
+def get_amounts(rng, count):
+	"""Random amounts of 0 to 3 decimals, some negative (reversals) and some on a half cent"""
+	amounts = []
+	for _ in range(count):
+		if rng.random() < 0.05:
+			amounts.append(rng.choice(BOUNDARY_AMOUNTS))
+		else:
+			amount = round(rng.uniform(0, 10 ** rng.randint(0, 7)), rng.randint(0, 3))
+			amounts.append(-amount if rng.random() < 0.1 else amount)
+	return amounts
+
+
+class TestLedgerTotals(unittest.TestCase):
+	def assert_matches_reference(self, totals, reference):
+		for field, expected in reference.items():
+			self.assertEqual(Decimal(repr(getattr(totals, field))), expected, field)
+
+	def test_boundary_amounts(self):
+		for amount in BOUNDARY_AMOUNTS:
+			self.assertEqual(to_minor_units(amount), int(to_cents(amount) * 100), amount)
+
+	def test_random_ledgers_per_entry(self):
+		rng = random.Random(39)
+		for _ in range(200):
+			count = rng.randint(0, 500)
+			opening = get_amounts(rng, 1)[0]
+			debits, credits = get_amounts(rng, count), get_amounts(rng, count)
+
+			totals = LedgerTotals(opening)
+			for debit, credit in zip(debits, credits, strict=True):
+				totals.add(debit, credit)
+
+			self.assert_matches_reference(totals, get_reference(opening, debits, credits))
+
+	def test_random_ledgers_in_batches(self):
+		rng = random.Random(1039)
+		for count in (0, 1, 999, 1000, 5000):
+			opening = get_amounts(rng, 1)[0]
+			debits, credits = get_amounts(rng, count), get_amounts(rng, count)
+
+			totals = LedgerTotals(opening)
+			totals.add_many(debits, credits)
+
+			self.assert_matches_reference(totals, get_reference(opening, debits, credits))
+
+	def test_running_balances(self):
+		rng = random.Random(3039)
+		for count in (0, 1, 999, 1000, 3000):
+			opening = get_amounts(rng, 1)[0]
+			debits, credits = get_amounts(rng, count), get_amounts(rng, count)
+
+			totals = LedgerTotals(opening)
+			balances = totals.add_running(debits, credits)
+
+			expected = to_cents(opening)
+			for debit, credit, balance in zip(debits, credits, balances, strict=True):
+				expected += to_cents(debit) - to_cents(credit)
+				self.assertEqual(Decimal(repr(balance)), expected)
+			self.assert_matches_reference(totals, get_reference(opening, debits, credits))
+
+	@unittest.skipIf(ledger_totals.np is None, "NumPy is not installed")
+	def test_vectorized_sum_matches_loop(self):
+		amounts = get_amounts(random.Random(2039), 5000) + BOUNDARY_AMOUNTS * 100
+		self.assertEqual(sum_minor_units(amounts), sum(to_minor_units(amount) for amount in amounts))
+
+	def test_float_accumulation_drifts(self):
+		"""The float running total this replaces drifts, the cent totals do not"""
+		totals = LedgerTotals()
+		total = 0.0
+		for _ in range(10000):
+			totals.add(0.1, 0)
+			total += 0.1
+
+		self.assertNotEqual(total, 1000.0)
+		self.assertEqual(totals.period_debit, 1000.0)
@@ -0,0 +1,127 @@
+"""
+Voucher details for the party detailed ledger.
+
+Each voucher type has an enricher: a function taking all voucher numbers of
+that type in the ledger and returning {voucher_no: row fields} from a single
+query, so details cost one query per voucher type instead of one per row.
+
+Other apps can add or replace enrichers with a hook:
+
+	ledger_voucher_enrichers = {
+		"Expense Claim": "my_app.ledger.enrich_expense_claims"
+	}
+"""
+import frappe
+
+# Child table holding the items of each invoice voucher type
+INVOICE_ITEM_DOCTYPES = {
+	"Sales Invoice": "Sales Invoice Item",
+	"Purchase Invoice": "Purchase Invoice Item"
+}
+
+
+def enrich_vouchers(gl_entries):
+	"""Row fields of every voucher in gl_entries, as {(voucher_type, voucher_no): fields}"""
+	voucher_nos = {}
+	for gle in gl_entries:
+		voucher_nos.setdefault(gle.voucher_type, set()).add(gle.voucher_no)
+
+	enrichers = get_enrichers()
+	details = {}
+
+	for voucher_type, names in voucher_nos.items():
+		enricher = enrichers.get(voucher_type)
+		if not enricher:
+			continue
+
+		for voucher_no, fields in enricher(list(names)).items():
+			details[(voucher_type, voucher_no)] = fields
+
+	return details
+
+
+def get_enrichers():
+	"""Enricher functions by voucher type, including those added by app hooks"""
+	enrichers = dict(ENRICHERS)
+	for voucher_type, methods in (frappe.get_hooks("ledger_voucher_enrichers") or {}).items():
+		# The hook of the last installed app wins
+		method = methods[-1] if isinstance(methods, list) else methods
+		enrichers[voucher_type] = frappe.get_attr(method)
+	return enrichers
+
+
+def enrich_invoices(voucher_type, voucher_nos):
+	"""Location, payment status and item count of Sales / Purchase Invoices"""
+	invoices = frappe.db.sql(f"""
+		SELECT
+			inv.name,
+			inv.set_warehouse,
+			inv.status,
+			(SELECT COUNT(*) FROM `tab{INVOICE_ITEM_DOCTYPES[voucher_type]}` item
+				WHERE item.parent = inv.name AND item.parenttype = %(voucher_type)s) as item_count
+		FROM `tab{voucher_type}` inv
+		WHERE inv.name IN %(voucher_nos)s
+	""", {"voucher_type": voucher_type, "voucher_nos": tuple(voucher_nos)}, as_dict=1)
+
+	return {
+		invoice.name: {
+			"type": "Invoice",
+			"location": invoice.set_warehouse or "",
+			"payment_status": "Paid" if invoice.status == "Paid" else "NOT PAID",
+			"notes": "NOT PAID" if invoice.status != "Paid" else "",
+			"item_count": invoice.item_count
+		}
+		for invoice in invoices
+	}
+
+
+def enrich_sales_invoices(voucher_nos):
+	return enrich_invoices("Sales Invoice", voucher_nos)
+
+
+def enrich_purchase_invoices(voucher_nos):
+	return enrich_invoices("Purchase Invoice", voucher_nos)
+
+
+def enrich_payment_entries(voucher_nos):
+	"""Mode of payment and reference of Payment Entries"""
+	payments = frappe.db.sql("""
+		SELECT name, mode_of_payment, reference_no
+		FROM `tabPayment Entry`
+		WHERE name IN %(voucher_nos)s
+	""", {"voucher_nos": tuple(voucher_nos)}, as_dict=1)
+
+	return {
+		payment.name: {
+			"type": "Payment",
+			"payment_method": payment.mode_of_payment or "Bank Transfer",
+			"notes": payment.reference_no or "Payment received"
+		}
+		for payment in payments
+	}
+
+
+def enrich_journal_entries(voucher_nos):
+	"""Entry type, cheque and remark of Journal Entries"""
+	journals = frappe.db.sql("""
+		SELECT name, voucher_type, cheque_no, user_remark
+		FROM `tabJournal Entry`
+		WHERE name IN %(voucher_nos)s
+	""", {"voucher_nos": tuple(voucher_nos)}, as_dict=1)
+
+	return {
+		journal.name: {
+			"type": "Journal",
+			"payment_method": journal.voucher_type or "",
+			"notes": journal.cheque_no or journal.user_remark or ""
+		}
+		for journal in journals
+	}
+
+
+ENRICHERS = {
+	"Sales Invoice": enrich_sales_invoices,
+	"Purchase Invoice": enrich_purchase_invoices,
+	"Payment Entry": enrich_payment_entries,
+	"Journal Entry": enrich_journal_entries
+}
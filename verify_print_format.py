@@ -1,5 +1,6 @@
 import frappe
 
+
 def verify_print_format():
     """Verify that the Detailed Invoice Print format exists"""
     frappe.connect(site='local.net')